@@ -3,22 +3,23 @@ FastAPI application for Tamatar-Bhai MVP
 Main application entry point with API endpoints
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 
 # Import local modules
-from database import get_db, init_database, populate_dishes_from_csv
+from database import get_db, init_database, populate_dishes_from_csv, AsyncSessionLocal, async_engine
 from models import (
-    PreviewRequest, PreviewResponse, 
+    PreviewRequest, PreviewResponse, PreviewBatchRequest,
     CompareRequest, CompareResponse,
     WeeklyResponse, DishModel, ErrorResponse, UserMealEntry
 )
@@ -41,6 +42,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Mount static files for images
@@ -59,15 +61,61 @@ def load_model_routes():
 model_routes = load_model_routes()
 
 
+async def backfill_daily_rollups():
+    """Build daily_rollups for databases that predate the table"""
+    from services.rollup_service import rollup_service
+    
+    async with AsyncSessionLocal() as db:
+        await rollup_service.backfill_if_empty(db)
+
+
+async def load_dish_catalog():
+    """Load the dish catalog snapshot that serves matching and /api/dishes"""
+    from services.catalog_service import catalog_service
+    
+    async with AsyncSessionLocal() as db:
+        await catalog_service.load(db)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
     try:
         init_database()
         populate_dishes_from_csv()
+        await backfill_daily_rollups()
+        await load_dish_catalog()
         logger.info("✅ Database initialized successfully")
     except Exception as e:
         logger.error(f"❌ Database initialization failed: {e}")
+    
+    from services.catalog_service import catalog_service
+    catalog_service.start_watcher(float(os.getenv("CATALOG_WATCH_SECONDS") or 0))
+    
+    try:
+        from services.service_manager import service_manager
+        await service_manager.start()
+    except Exception as e:
+        logger.error(f"❌ External API clients failed to start: {e}")
+    
+    if (os.getenv("WARMUP_ON_STARTUP") or "false").lower() in ("1", "true", "yes"):
+        from services.warmup_service import cache_warmer
+        cache_warmer.start_background(limit=int(os.getenv("WARMUP_LIMIT") or 0) or None)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled connections (external APIs, database) and stop the chart render pool"""
+    from services.service_manager import service_manager
+    from services.chart_service import chart_service
+    from services.catalog_service import catalog_service
+    from services.warmup_service import cache_warmer
+    
+    await cache_warmer.stop_background()
+    await catalog_service.stop_watcher()
+    await service_manager.aclose()
+    chart_service.shutdown()
+    await async_engine.dispose()
 
 
 @app.get("/")
@@ -93,86 +141,60 @@ async def health_check():
 
 # API Endpoints
 
+def _preview_response(preview_data: Dict[str, Any], image_variant: str) -> PreviewResponse:
+    """Build the preview response, pointing image_url at the requested size variant (if it exists)"""
+    # Variant URLs are resolved when the image is generated and cached with the preview
+    original_url = preview_data["image_url"]
+    image_variants = preview_data.get("image_variants") or {"original": original_url}
+    return PreviewResponse(**{
+        **preview_data,
+        "image_url": image_variants.get(image_variant, original_url),
+        "image_variants": image_variants
+    })
+
+
 @app.post("/api/preview", response_model=PreviewResponse)
 async def generate_preview(
     request: PreviewRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate daily preview with image, calories, and captions
     """
     try:
-        from services.service_manager import service_manager
-        from services.nutrition_service import nutrition_service
         from services.cache_service import cache_service
+        from services.preview_pipeline import preview_pipeline
+        from services.rollup_service import rollup_service
+        from services.catalog_service import catalog_service
         from database import UserMeal
         
+        # Pick up dishes added by /admin/dish (in any worker)
+        await catalog_service.refresh_if_stale(db)
+        
         # Check cache first
         cached_preview = await cache_service.get_cached_preview(request.dish, db)
         if cached_preview:
             logger.info(f"✅ Returning cached preview for '{request.dish}'")
-            return PreviewResponse(**cached_preview)
+            return _preview_response(cached_preview, request.image_variant)
         
-        # Get nutrition information
-        dish_info = nutrition_service.get_dish_info(request.dish)
-        calories = dish_info['calories']
-        
-        # Generate image (check cache first)
-        cached_image = await cache_service.get_cached_image(request.dish, db)
-        if cached_image:
-            image_url = cached_image
-            logger.info(f"✅ Using cached image for '{request.dish}'")
-        else:
-            image_url = await service_manager.generate_dish_image(request.dish)
-            # Cache the generated image
-            await cache_service.cache_image(request.dish, image_url, db)
-        
-        # Generate captions (check cache first)
-        cached_captions = await cache_service.get_cached_captions(request.dish, db)
-        if cached_captions:
-            captions = cached_captions
-            logger.info(f"✅ Using cached captions for '{request.dish}'")
-        else:
-            # Generate both bhai and formal captions
-            bhai_caption = await service_manager.generate_bhai_caption(request.dish, calories)
-            formal_caption = await service_manager.generate_formal_caption(request.dish, calories)
-            
-            captions = {
-                "bhai": bhai_caption,
-                "formal": formal_caption
-            }
-            
-            # Cache the captions
-            await cache_service.cache_captions(request.dish, captions, db)
+        # Release the lookup's connection before waiting on a (possibly shared) generation
+        await db.commit()
         
-        # Create response
-        preview_data = {
-            "dish": request.dish,
-            "calories": calories,
-            "image_url": image_url,
-            "captions": captions,
-            "meta": {
-                "model": "openai-gpt-4o-mini",
-                "generated_at": datetime.utcnow().isoformat(),
-                "matched_dish": dish_info.get('matched_name', request.dish),
-                "confidence": dish_info.get('confidence', 100)
-            }
-        }
-        
-        # Cache the complete preview
-        await cache_service.cache_preview(request.dish, preview_data, db)
+        # Image and captions are generated concurrently; concurrent misses share one run
+        preview_data = await preview_pipeline.generate(request.dish)
         
         # Track user meal consumption
         user_meal = UserMeal(
             dish_name=request.dish,
             meal_type=request.meal,
-            calories=calories
+            calories=preview_data["calories"],
+            consumed_at=datetime.utcnow()
         )
         db.add(user_meal)
-        db.commit()
+        await rollup_service.record_meal(db, user_meal)
+        await db.commit()
         
-        logger.info(f"✅ Generated complete preview for '{request.dish}' ({calories} cal)")
-        return PreviewResponse(**preview_data)
+        return _preview_response(preview_data, request.image_variant)
         
     except Exception as e:
         logger.error(f"Preview generation failed: {e}")
@@ -182,26 +204,135 @@ async def generate_preview(
         )
 
 
+# Streaming (NDJSON) responses and the page size cap for the cursor-paginated list endpoints
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+MAX_PAGE_SIZE = 1000
+
+
+@app.post("/api/preview/batch")
+async def generate_preview_batch(
+    request: PreviewBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate daily previews for several dishes in one request.
+    Streams one NDJSON line per item as soon as its preview is ready:
+    {"index", "dish", "cached", "preview"} or {"index", "dish", "error"}.
+    Repeated dishes are generated once.
+    """
+    try:
+        from services.preview_pipeline import preview_pipeline
+        from services.catalog_service import catalog_service
+        
+        # Pick up dishes added by /admin/dish (in any worker)
+        await catalog_service.refresh_if_stale(db)
+        await db.commit()
+        
+        # Request items per normalized dish name, in request order
+        items_by_dish: Dict[str, List[int]] = {}
+        for index, item in enumerate(request.items):
+            items_by_dish.setdefault(preview_pipeline.normalize(item.dish), []).append(index)
+        
+    except Exception as e:
+        logger.error(f"Batch preview generation failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate previews: {str(e)}"
+        )
+    
+    async def stream_results():
+        from services.pagination import ndjson
+        from services.rollup_service import rollup_service
+        from database import UserMeal
+        
+        generated_meals = []
+        async for result in preview_pipeline.generate_batch([item.dish for item in request.items]):
+            lines = []
+            for index in items_by_dish[result['dish']]:
+                item = request.items[index]
+                if result['error'] is not None:
+                    lines.append({"index": index, "dish": item.dish, "error": result['error']})
+                    continue
+                
+                preview = _preview_response(result['preview'], item.image_variant)
+                lines.append({
+                    "index": index,
+                    "dish": item.dish,
+                    "cached": result['cached'],
+                    "preview": preview.model_dump()
+                })
+                if not result['cached']:
+                    generated_meals.append((item, result['preview']["calories"]))
+            yield ndjson(lines)
+        
+        # Track consumption of generated previews, as /api/preview does, in one transaction
+        if generated_meals:
+            async with AsyncSessionLocal() as meal_db:
+                for item, calories in generated_meals:
+                    user_meal = UserMeal(
+                        dish_name=item.dish,
+                        meal_type=item.meal,
+                        calories=calories,
+                        consumed_at=datetime.utcnow()
+                    )
+                    meal_db.add(user_meal)
+                    await rollup_service.record_meal(meal_db, user_meal)
+                await meal_db.commit()
+    
+    return StreamingResponse(stream_results(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def _decode_dish_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Dish id a /api/dishes cursor points past; raises HTTPException(400) if malformed"""
+    from services.pagination import decode_cursor
+    
+    if not cursor:
+        return None
+    try:
+        (after,) = decode_cursor(cursor)
+        return int(after)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: '{cursor}'"
+        )
+
+
 @app.get("/api/dishes")
-async def get_dishes(db: Session = Depends(get_db)):
+async def get_dishes(
+    meal_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Get list of all available dishes
+    Get list of available dishes.
+    Without parameters returns the whole catalog. `limit` pages it (the next
+    page's cursor is in the X-Next-Cursor header), `meal_type` filters it and
+    `format=ndjson` streams one dish per line.
     """
     try:
-        from database import Dish
-        dishes = db.query(Dish).all()
-        
-        return [
-            {
-                "id": dish.id,
-                "name": dish.name,
-                "calories": dish.calories,
-                "meal_type": dish.meal_type,
-                "description": dish.description
-            }
-            for dish in dishes
-        ]
+        from services.catalog_service import catalog_service
+        from services.pagination import encode_cursor, ndjson
+        
+        after = _decode_dish_cursor(cursor)
+        snapshot = await catalog_service.refresh_if_stale(db)
+        
+        if format == "json" and after is None and limit is None and not meal_type:
+            # Served from the catalog snapshot, serialized once per version
+            return Response(content=snapshot.table.dish_list_json(), media_type="application/json")
+        
+        dishes, next_after = snapshot.table.page(after=after, meal_type=meal_type, limit=limit)
+        headers = {"X-Next-Cursor": encode_cursor(next_after)} if next_after is not None else {}
+        
+        if format == "ndjson":
+            chunks = (ndjson(dishes[i:i + MAX_PAGE_SIZE]) for i in range(0, len(dishes), MAX_PAGE_SIZE))
+            return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+        return JSONResponse(content=dishes, headers=headers)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch dishes: {e}")
         raise HTTPException(
@@ -211,25 +342,48 @@ async def get_dishes(db: Session = Depends(get_db)):
     
 
 @app.get("/api/user_meals")
-async def get_dishes(db: Session = Depends(get_db)):
+async def get_user_meals(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    meal_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Get list of all available user meals
+    Get user meals, newest first.
+    Without parameters returns the whole history, meals without a timestamp
+    last. `start`/`end` ('YYYY-MM-DD', inclusive) and `meal_type` filter it,
+    `limit` pages it (the next page's cursor is in the X-Next-Cursor header)
+    and `format=ndjson` streams every matching meal (or the first `limit`)
+    one per line. Pages and date ranges only list timestamped meals.
     """
     try:
-        from database import UserMeal
-        user_meals = db.query(UserMeal).all()
-        
-        return [
-            {
-                "id": user_meal.id,
-                "dish_name": user_meal.dish_name,
-                "meal_type": user_meal.meal_type,
-                "calories": user_meal.calories,
-                "consumed_at": user_meal.consumed_at
-            }
-            for user_meal in user_meals
-        ]
+        from services.meal_history_service import meal_history_service
+        
+        filters = {
+            "start": _parse_date_param("start", start) if start else None,
+            "end": _parse_date_param("end", end) if end else None,
+            "meal_type": meal_type,
+            "cursor": cursor
+        }
         
+        try:
+            if format == "ndjson":
+                chunks, next_cursor = await meal_history_service.stream_ndjson(db, limit=limit, **filters)
+            else:
+                meals, next_cursor = await meal_history_service.page(db, limit=limit, **filters)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        if format == "ndjson":
+            return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+        return JSONResponse(content=meals, headers=headers)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch user_meals: {e}")
         raise HTTPException(
@@ -241,7 +395,7 @@ async def get_dishes(db: Session = Depends(get_db)):
 @app.post("/api/compare", response_model=CompareResponse)
 async def compare_dishes(
     request: CompareRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Compare two dishes and provide bhai-style recommendation
@@ -249,6 +403,9 @@ async def compare_dishes(
     try:
         from services.service_manager import service_manager
         from services.nutrition_service import nutrition_service
+        from services.catalog_service import catalog_service
+        
+        await catalog_service.refresh_if_stale(db)
         
         # Get nutrition information for both dishes
         dish_a_info = nutrition_service.get_dish_info(request.dishA)
@@ -327,7 +484,7 @@ def _parse_date_param(name: str, value: str) -> datetime:
 async def get_weekly_snapshot(
     start: str,
     end: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get weekly snapshot with chart and summary.
@@ -336,54 +493,32 @@ async def get_weekly_snapshot(
     try:
         from services.service_manager import service_manager
         from services.chart_service import chart_service
-        from database import UserMeal
+        from services.meal_stats_service import meal_stats_service
 
         # Parse dates (raises HTTPException with clear message on failure)
         start_date = _parse_date_param("start", start)
         end_date = _parse_date_param("end", end)
 
-        # Query user meals for the date range (include end date)
-        meals = db.query(UserMeal).filter(
-            UserMeal.consumed_at >= start_date,
-            UserMeal.consumed_at <= end_date + timedelta(days=1)
-        ).all()
-
-        # Convert to list of dictionaries
-        meal_data = [
-            {
-                "dish_name": meal.dish_name,
-                "meal_type": meal.meal_type,
-                "calories": meal.calories,
-                "consumed_at": meal.consumed_at
-            }
-            for meal in meals
-        ]
+        # Per-day totals and dish stats aggregated in SQL (one round trip)
+        stats = await meal_stats_service.get_range_summary(db, start_date, end_date)
 
         # Calculate totals
-        total_calories = sum(m["calories"] for m in meal_data)
+        total_calories = stats["total_calories"]
         date_diff = (end_date - start_date).days + 1
         avg_per_day = total_calories // date_diff if date_diff > 0 else 0
 
-        # Generate chart (chart_service expects start/end strings in your earlier code)
-        chart_url = await chart_service.generate_weekly_chart(meal_data, start, end)
+        # Generate chart from the same compact per-day series
+        chart_url = await chart_service.generate_weekly_chart(stats["daily_calories"], start, end)
 
         # Generate summary via service_manager
         date_range_str = f"{start} to {end}"
         summary = await service_manager.generate_weekly_summary(total_calories, date_range_str, avg_per_day)
 
         # Stats
-        meal_count = len(meal_data)
-        unique_dishes = len({m["dish_name"] for m in meal_data})
-
-        # Most consumed dish
-        if meal_data:
-            dish_counts = {}
-            for m in meal_data:
-                dish_counts[m["dish_name"]] = dish_counts.get(m["dish_name"], 0) + 1
-            most_consumed = max(dish_counts.items(), key=lambda x: x[1])
-            most_consumed_dish, most_consumed_count = most_consumed[0], most_consumed[1]
-        else:
-            most_consumed_dish, most_consumed_count = None, 0
+        meal_count = stats["meal_count"]
+        unique_dishes = stats["unique_dishes"]
+        most_consumed_dish = stats["most_consumed_dish"]
+        most_consumed_count = stats["most_consumed_count"]
 
         # Response
         response_data = {
@@ -422,22 +557,29 @@ async def get_weekly_snapshot(
 @app.post("/admin/dish")
 async def add_dish(
     dish: DishModel,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Add or update a dish in the database
     """
     try:
         from database import Dish
+        from services.catalog_service import catalog_service
+        
+        # Stamp the write with a new catalog version so snapshots refresh incrementally
+        revision = await catalog_service.bump_version(db)
         
         # Check if dish exists
-        existing_dish = db.query(Dish).filter(Dish.name == dish.name).first()
+        existing_dish = (await db.execute(
+            select(Dish).where(Dish.name == dish.name)
+        )).scalars().first()
         
         if existing_dish:
             # Update existing dish
             existing_dish.calories = dish.calories
             existing_dish.meal_type = dish.meal_type
             existing_dish.description = dish.description
+            existing_dish.revision = revision
             existing_dish.updated_at = datetime.utcnow()
             message = f"Updated dish: {dish.name}"
         else:
@@ -446,65 +588,110 @@ async def add_dish(
                 name=dish.name,
                 calories=dish.calories,
                 meal_type=dish.meal_type,
-                description=dish.description
+                description=dish.description,
+                revision=revision
             )
             db.add(new_dish)
             message = f"Added new dish: {dish.name}"
         
-        db.commit()
+        await db.commit()
+        
+        # This worker serves the change right away; others within CATALOG_REFRESH_SECONDS
+        await catalog_service.refresh(db)
         return {"message": message, "status": "success"}
         
     except Exception as e:
         logger.error(f"Failed to add/update dish: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to add/update dish: {str(e)}"
         )
 
+@app.post("/admin/catalog/reload")
+async def reload_catalog():
+    """
+    Re-import the nutrition CSV and publish the new dish catalog
+    
+    Lookups keep being served from the current snapshot until the new one is ready.
+    """
+    try:
+        from services.catalog_service import catalog_service
+        
+        result = await catalog_service.reload_from_csv()
+        return {"message": "Catalog reloaded", "status": "success", **result}
+        
+    except Exception as e:
+        logger.error(f"Failed to reload catalog: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to reload catalog: {str(e)}"
+        )
+
 @app.post("/admin/user_meal")
 async def add_user_meal(
     user_meal: UserMealEntry,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Add or update a user meal in the database
     """
     try:
-        from database import UserMeal
+        from database import UserMeal, Dish
+        from services.rollup_service import rollup_service
+        from services.meal_history_service import MealHistoryService
+        
+        calories = user_meal.calories
+        if not calories:
+            matching_dish = (await db.execute(
+                select(Dish).where(Dish.name == user_meal.dish_name)
+            )).scalars().first()
+            if not matching_dish:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"No calories given and dish '{user_meal.dish_name}' is not in the catalog"
+                )
+            calories = matching_dish.calories
         
         # Check if user_meal exists
-        existing_entry = db.query(UserMeal).filter(UserMeal.consumed_at == user_meal.consumed_at).first()
+        existing_entry = None
+        if user_meal.consumed_at:
+            existing_entry = (await db.execute(
+                MealHistoryService.entry_query(user_meal.consumed_at)
+            )).scalars().first()
         
         if existing_entry:
-            # Update existing user_meal
+            # Update existing user_meal, moving its contribution between rollup rows
+            await rollup_service.unrecord_meal(
+                db, existing_entry.consumed_at, existing_entry.meal_type,
+                existing_entry.dish_name, existing_entry.calories
+            )
             existing_entry.dish_name = user_meal.dish_name
             existing_entry.meal_type = user_meal.meal_type
-            if not user_meal.calories:
-                matching_dish = db.query(Dish).filter_by(name == user_meal.dish_name).first()
-                existing_entry.calories = matching_dish.calories
-            else:
-                existing_entry.calories = user_meal.calories
-            
+            existing_entry.calories = calories
             existing_entry.consumed_at = user_meal.consumed_at
+            await rollup_service.record_meal(db, existing_entry)
             message = f"Updated user_meal: {user_meal}"
         else:
             # Create new user_meal
             new_entry = UserMeal(
                 dish_name=user_meal.dish_name,
                 meal_type=user_meal.meal_type,
-                calories=user_meal.calories,
-                consumed_at=user_meal.consumed_at
+                calories=calories,
+                consumed_at=user_meal.consumed_at or datetime.utcnow()
             )
             db.add(new_entry)
+            await rollup_service.record_meal(db, new_entry)
             message = f"Added new user_meal: {user_meal}"
         
-        db.commit()
+        await db.commit()
         return {"message": message, "status": "success"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to add/update user_meal: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to add/update user_meal: {str(e)}"
@@ -513,20 +700,16 @@ async def add_user_meal(
 @app.post("/admin/cache/clear")
 async def clear_cache(
     dish_name: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Clear cache for a specific dish
     """
     try:
-        from database import Cache
-        
-        # Delete cache entries for the dish
-        deleted_count = db.query(Cache).filter(
-            Cache.dish_name == dish_name
-        ).delete()
+        from services.cache_service import cache_service
         
-        db.commit()
+        # Delete cache entries for the dish (both database and memory tiers)
+        deleted_count = await cache_service.invalidate_cache(dish_name, db)
         
         return {
             "message": f"Cleared {deleted_count} cache entries for {dish_name}",
@@ -535,13 +718,31 @@ async def clear_cache(
         
     except Exception as e:
         logger.error(f"Failed to clear cache: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to clear cache: {str(e)}"
         )
 
 
+@app.get("/admin/cache/stats")
+async def get_cache_stats(db: AsyncSession = Depends(get_db)):
+    """
+    Get cache statistics including per-tier hit/miss counters
+    """
+    try:
+        from services.cache_service import cache_service
+        
+        return await cache_service.get_cache_stats(db)
+        
+    except Exception as e:
+        logger.error(f"Failed to get cache stats: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to get cache stats: {str(e)}"
+        )
+
+
 # Error handlers
 
 @app.exception_handler(HTTPException)
@@ -2,20 +2,186 @@
 Database configuration and models for Tamatar-Bhai MVP
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Date, Text, Float, UniqueConstraint, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool, QueuePool, AsyncAdaptedQueuePool
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Any, Dict, Optional
 import os
 
 # Database URL from environment or default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/tamatar_bhai.db")
 
-# Create engine
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# INSERT constructs supporting ON CONFLICT DO UPDATE, by dialect name
+UPSERT_DIALECTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
 
-# Create session
+# Async drivers used by the request path when DATABASE_URL names a sync one
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """Same database as database_url, reached through its async driver"""
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() == driver:
+        return database_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Boolean environment flag: 1/true/yes are true, anything else set is false"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+@dataclass
+class DatabaseSettings:
+    """Engine tuning; every field can be overridden from the environment"""
+    # SQLite pragmas applied to each new connection
+    sqlite_journal_mode: str = "WAL"        # readers no longer block the writer
+    sqlite_synchronous: str = "NORMAL"      # safe with WAL, one fsync per checkpoint
+    sqlite_cache_size_kb: int = 20000       # page cache per connection
+    sqlite_mmap_size: int = 268435456       # 256 MB memory-mapped reads
+    sqlite_busy_timeout_ms: int = 5000      # wait for the write lock instead of failing
+    # Connection pool
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: int = 30
+    pool_recycle: int = 1800                # server databases only
+    pool_pre_ping: bool = True              # server databases only
+    
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        """Read DB_* / SQLITE_* overrides, falling back to the defaults above"""
+        defaults = cls()
+        return cls(
+            sqlite_journal_mode=os.getenv("SQLITE_JOURNAL_MODE") or defaults.sqlite_journal_mode,
+            sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS") or defaults.sqlite_synchronous,
+            sqlite_cache_size_kb=int(os.getenv("SQLITE_CACHE_SIZE_KB") or defaults.sqlite_cache_size_kb),
+            sqlite_mmap_size=int(os.getenv("SQLITE_MMAP_SIZE") or defaults.sqlite_mmap_size),
+            sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS") or defaults.sqlite_busy_timeout_ms),
+            pool_size=int(os.getenv("DB_POOL_SIZE") or defaults.pool_size),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW") or defaults.max_overflow),
+            pool_timeout=int(os.getenv("DB_POOL_TIMEOUT") or defaults.pool_timeout),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE") or defaults.pool_recycle),
+            pool_pre_ping=_env_flag("DB_POOL_PRE_PING", defaults.pool_pre_ping)
+        )
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(database_url: str, settings: DatabaseSettings,
+                   is_async: bool = False) -> Dict[str, Any]:
+    """
+    create_engine keyword arguments for the backend behind database_url
+    
+    SQLite gets a small thread-shared pool (an in-memory database must share
+    one connection); server databases get a pre-pinged, recycled pool.
+    """
+    url = make_url(database_url)
+    
+    if url.get_backend_name() == "sqlite":
+        options = {
+            "connect_args": {
+                "check_same_thread": False,
+                "timeout": settings.sqlite_busy_timeout_ms / 1000
+            }
+        }
+        if _is_memory_sqlite(url):
+            options["poolclass"] = StaticPool
+        else:
+            options.update(
+                poolclass=AsyncAdaptedQueuePool if is_async else QueuePool,
+                pool_size=settings.pool_size,
+                max_overflow=settings.max_overflow,
+                pool_timeout=settings.pool_timeout
+            )
+        return options
+    
+    return {
+        "pool_size": settings.pool_size,
+        "max_overflow": settings.max_overflow,
+        "pool_timeout": settings.pool_timeout,
+        "pool_recycle": settings.pool_recycle,
+        "pool_pre_ping": settings.pool_pre_ping
+    }
+
+
+def apply_sqlite_pragmas(engine: Engine, settings: DatabaseSettings):
+    """Run the tuning pragmas on every new SQLite connection of engine"""
+    url = engine.url
+    if url.get_backend_name() != "sqlite":
+        return
+    
+    pragmas = [
+        f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA synchronous = {settings.sqlite_synchronous}",
+        f"PRAGMA cache_size = -{settings.sqlite_cache_size_kb}",
+        f"PRAGMA mmap_size = {settings.sqlite_mmap_size}"
+    ]
+    # WAL needs a shared file; in-memory databases keep their own journal
+    if not _is_memory_sqlite(url):
+        pragmas.insert(0, f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+    
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def build_engine(database_url: str = DATABASE_URL, settings: Optional[DatabaseSettings] = None) -> Engine:
+    """Create an engine tuned for its backend"""
+    settings = settings or DatabaseSettings.from_env()
+    engine = create_engine(database_url, **engine_options(database_url, settings))
+    apply_sqlite_pragmas(engine, settings)
+    return engine
+
+
+def build_async_engine(database_url: str = ASYNC_DATABASE_URL,
+                       settings: Optional[DatabaseSettings] = None) -> AsyncEngine:
+    """Create an async engine with the same tuning as build_engine"""
+    settings = settings or DatabaseSettings.from_env()
+    async_engine = create_async_engine(database_url, **engine_options(database_url, settings, is_async=True))
+    apply_sqlite_pragmas(async_engine.sync_engine, settings)
+    return async_engine
+
+
+# Engine settings from environment or defaults
+database_settings = DatabaseSettings.from_env()
+
+# Sync engine for scripts (init_db.py, migrations, CLI tools)
+engine = build_engine(DATABASE_URL, database_settings)
+
+# Async engine for the request path
+async_engine = build_async_engine(ASYNC_DATABASE_URL, database_settings)
+
+# Create sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -33,20 +199,50 @@ class Dish(Base):
     carbs_g = Column(Float, nullable=True)
     fat_g = Column(Float, nullable=True)
     description = Column(Text, nullable=True)
+    revision = Column(Integer, nullable=False, default=0, index=True)  # catalog version of the last change
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class CatalogState(Base):
+    """Single-row change counter for the dish catalog"""
+    __tablename__ = "catalog_state"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def bump_catalog_version(db) -> int:
+    """
+    Increment the catalog version inside the caller's (sync) transaction
+    
+    Every dish write stamps its row with the returned version so catalog
+    snapshots can refresh by fetching only dishes with a newer revision.
+    """
+    from sqlalchemy import select, update
+    
+    db.execute(
+        update(CatalogState)
+        .where(CatalogState.id == 1)
+        .values(version=CatalogState.version + 1, updated_at=datetime.utcnow())
+    )
+    return db.execute(select(CatalogState.version).where(CatalogState.id == 1)).scalar_one()
+
+
 class Cache(Base):
     """Model for caching generated content"""
     __tablename__ = "cache"
+    __table_args__ = (
+        Index("ux_cache_dish_name_cache_type", "dish_name", "cache_type", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    dish_name = Column(String, nullable=False, index=True)
+    dish_name = Column(String, nullable=False)
     cache_type = Column(String, nullable=False)  # 'preview', 'image', 'caption'
     cache_data = Column(Text, nullable=False)  # JSON data
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
 
 
 class UserMeal(Base):
@@ -57,64 +253,172 @@ class UserMeal(Base):
     dish_name = Column(String, nullable=False)
     meal_type = Column(String, nullable=False)
     calories = Column(Integer, nullable=False)
-    consumed_at = Column(DateTime, default=datetime.utcnow)
+    consumed_at = Column(DateTime, default=datetime.utcnow, index=True)
 
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+class DailyRollup(Base):
+    """Pre-aggregated meal totals per day and meal type (maintained on meal writes)"""
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "meal_type", name="uq_daily_rollups_day_meal_type"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    meal_type = Column(String, nullable=False)
+    calories_sum = Column(Integer, nullable=False, default=0)
+    meal_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DailyDishRollup(Base):
+    """Pre-aggregated meal counts per day, meal type and dish (maintained with daily_rollups)"""
+    __tablename__ = "daily_dish_rollups"
+    __table_args__ = (
+        UniqueConstraint("day", "meal_type", "dish_name", name="uq_daily_dish_rollups_day_meal_type_dish"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    meal_type = Column(String, nullable=False)
+    dish_name = Column(String, nullable=False)
+    meal_count = Column(Integer, nullable=False, default=0)
+
+
+async def get_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 def init_database():
-    """Initialize database tables"""
+    """Initialize database tables and apply pending schema migrations"""
+    from migrations import run_migrations
+    
     Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
     print("✅ Database tables created successfully")
+    if applied:
+        print(f"✅ Applied {len(applied)} schema migration(s)")
+
+
+# Catalog columns compared when reloading (the CSV names the dish column dish_name)
+CATALOG_COLUMNS = ["calories", "meal_type", "protein_g", "carbs_g", "fat_g", "description"]
+
+
+def _normalize_catalog_frame(df):
+    """Dedupe, coerce types and turn NaN into None for a catalog DataFrame"""
+    import pandas as pd
+    
+    df = df.rename(columns={"dish_name": "name"})
+    df = df.dropna(subset=["name", "calories"])
+    
+    # Normalize names before deduping: "Dal " and "Dal" are one row of the unique name column
+    df = df.assign(name=df["name"].astype(str).str.split().str.join(" "))
+    df = df[df["name"] != ""].drop_duplicates("name", keep="last")
+    
+    df = df.assign(
+        calories=df["calories"].astype(int),
+        protein_g=pd.to_numeric(df["protein_g"], errors="coerce"),
+        carbs_g=pd.to_numeric(df["carbs_g"], errors="coerce"),
+        fat_g=pd.to_numeric(df["fat_g"], errors="coerce"),
+    )
+    return df[["name"] + CATALOG_COLUMNS].astype(object).where(df.notna(), None)
 
 
-def populate_dishes_from_csv():
-    """Populate dishes table from nutrition_lookup.csv"""
+def load_catalog(df, db) -> Dict[str, int]:
+    """
+    Upsert a catalog DataFrame into the dishes table
+    
+    Diffs the incoming rows against the table in one vectorized pass, then
+    writes only new dishes (executemany INSERT) and changed dishes (bulk
+    UPDATE by primary key) in a single transaction. Dishes missing from the
+    catalog are left alone so ones added through /admin/dish survive reloads.
+    
+    Args:
+        df: DataFrame with the nutrition_lookup.csv columns
+        db: Sync database session (the caller commits)
+        
+    Returns:
+        Counts of inserted, updated and unchanged dishes
+    """
+    import pandas as pd
+    from sqlalchemy import insert, select, update
+    
+    incoming = _normalize_catalog_frame(df)
+    existing = pd.DataFrame(
+        db.execute(select(Dish.id, Dish.name, *[getattr(Dish, column) for column in CATALOG_COLUMNS])).all(),
+        columns=["id", "name"] + CATALOG_COLUMNS
+    )
+    
+    merged = incoming.merge(existing, on="name", how="left", suffixes=("", "_db"), indicator=True)
+    is_new = merged["_merge"] == "left_only"
+    
+    changed = pd.Series(False, index=merged.index)
+    for column in CATALOG_COLUMNS:
+        ours, theirs = merged[column], merged[f"{column}_db"]
+        both_missing = ours.isna() & theirs.isna()
+        if column in ("protein_g", "carbs_g", "fat_g"):
+            differs = (pd.to_numeric(ours, errors="coerce") - pd.to_numeric(theirs, errors="coerce")).abs() > 1e-9
+            differs |= ours.isna() != theirs.isna()
+        else:
+            differs = ours != theirs
+        changed |= differs & ~both_missing
+    changed &= ~is_new
+    
+    now = datetime.utcnow()
+    inserts = merged.loc[is_new, ["name"] + CATALOG_COLUMNS].to_dict("records")
+    updates = merged.loc[changed, ["id"] + CATALOG_COLUMNS].to_dict("records")
+    revision = bump_catalog_version(db) if inserts or updates else None
+    for row in inserts:
+        row["revision"] = revision
+        row["created_at"] = now
+        row["updated_at"] = now
+    for row in updates:
+        row["id"] = int(row["id"])
+        row["revision"] = revision
+        row["updated_at"] = now
+    
+    if inserts:
+        db.execute(insert(Dish), inserts)
+    if updates:
+        db.execute(update(Dish), updates)
+    
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "unchanged": len(merged) - len(inserts) - len(updates)
+    }
+
+
+def populate_dishes_from_csv(csv_path: str = "data/nutrition_lookup.csv") -> Dict[str, int]:
+    """Upsert the dishes table from nutrition_lookup.csv, touching only changed dishes"""
     import pandas as pd
-    from sqlalchemy.orm import Session
     
     try:
         # Read CSV file
-        df = pd.read_csv("data/nutrition_lookup.csv")
+        df = pd.read_csv(csv_path)
         
-        # Create database session
         db = SessionLocal()
-        
-        # Check if dishes already exist
-        existing_count = db.query(Dish).count()
-        if existing_count > 0:
-            print(f"📊 Dishes table already has {existing_count} entries")
+        try:
+            counts = load_catalog(df, db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
             db.close()
-            return
-        
-        # Add dishes from CSV
-        dishes_added = 0
-        for _, row in df.iterrows():
-            dish = Dish(
-                name=row['dish_name'],
-                calories=int(row['calories']),
-                meal_type=row['meal_type'],
-                protein_g=float(row['protein_g']) if pd.notna(row['protein_g']) else None,
-                carbs_g=float(row['carbs_g']) if pd.notna(row['carbs_g']) else None,
-                fat_g=float(row['fat_g']) if pd.notna(row['fat_g']) else None,
-                description=row['description'] if pd.notna(row['description']) else None
-            )
-            db.add(dish)
-            dishes_added += 1
         
-        db.commit()
-        db.close()
-        print(f"✅ Added {dishes_added} dishes to database")
+        if counts["inserted"] or counts["updated"]:
+            print(f"✅ Catalog loaded: {counts['inserted']} added, {counts['updated']} updated, "
+                  f"{counts['unchanged']} unchanged")
+        else:
+            print(f"📊 Dishes table already up to date ({counts['unchanged']} entries)")
+        return counts
         
     except Exception as e:
         print(f"❌ Error populating dishes: {e}")
+        return {}
 
 
 if __name__ == "__main__":
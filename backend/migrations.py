@@ -0,0 +1,106 @@
+"""
+Schema migrations for Tamatar-Bhai MVP
+
+``Base.metadata.create_all`` creates missing tables but never touches tables
+that already exist, so indexes and other changes to existing tables are
+applied here. Each migration runs once, in order, and is recorded in the
+``schema_migrations`` table. Statements use ``IF [NOT] EXISTS`` so a fresh
+database (where create_all already built the indexes) just records them.
+"""
+
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_lookup_indexes(conn: Connection):
+    """Unique (dish_name, cache_type) index for cache getters/setters"""
+    # Keep only the newest row per key so the unique index can be built
+    deleted = conn.execute(text(
+        "DELETE FROM cache WHERE id NOT IN ("
+        " SELECT MAX(id) FROM cache GROUP BY dish_name, cache_type"
+        ")"
+    )).rowcount
+    if deleted:
+        logger.info(f"🧹 Removed {deleted} duplicate cache rows")
+
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_cache_dish_name_cache_type "
+        "ON cache (dish_name, cache_type)"
+    ))
+    # Superseded: the composite index covers dish_name-only lookups
+    conn.execute(text("DROP INDEX IF EXISTS ix_cache_dish_name"))
+
+
+def _cache_expires_at_index(conn: Connection):
+    """Index for cleanup_expired_cache and the expired-entry stats"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)"))
+
+
+def _user_meals_consumed_at_index(conn: Connection):
+    """Index for /api/weekly range scans and /admin/user_meal lookups"""
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_user_meals_consumed_at ON user_meals (consumed_at)"
+    ))
+
+
+def _catalog_revisions(conn: Connection):
+    """Catalog change counter and per-dish revision for incremental snapshot refresh"""
+    if "revision" not in {column["name"] for column in inspect(conn).get_columns("dishes")}:
+        conn.execute(text("ALTER TABLE dishes ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_dishes_revision ON dishes (revision)"))
+    conn.execute(text(
+        "INSERT INTO catalog_state (id, version, updated_at) "
+        "SELECT 1, 0, :now WHERE NOT EXISTS (SELECT 1 FROM catalog_state WHERE id = 1)"
+    ), {"now": datetime.utcnow()})
+
+
+# Ordered list of (version, name, migration). Append only; never renumber.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "cache_lookup_indexes", _cache_lookup_indexes),
+    (2, "cache_expires_at_index", _cache_expires_at_index),
+    (3, "user_meals_consumed_at_index", _user_meals_consumed_at_index),
+    (4, "catalog_revisions", _catalog_revisions),
+]
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+    Apply all pending migrations
+
+    Args:
+        engine: Engine of the database to migrate (tables must already exist)
+
+    Returns:
+        Versions applied by this call
+    """
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY,"
+            " name VARCHAR NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL"
+            ")"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    newly_applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+
+        # One transaction per migration: it is recorded only if it succeeds
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()}
+            )
+        newly_applied.append(version)
+        logger.info(f"✅ Applied migration {version:03d}_{name}")
+
+    return newly_applied
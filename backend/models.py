@@ -3,7 +3,7 @@ Pydantic models for request/response validation
 """
 
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Literal
 from datetime import datetime
 
 
@@ -11,6 +11,9 @@ class PreviewRequest(BaseModel):
     """Request model for daily preview generation"""
     dish: str = Field(..., min_length=1, max_length=100, description="Name of the dish")
     meal: str = Field(..., description="Meal type (breakfast, lunch, dinner, snack)")
+    image_variant: Literal["original", "thumb", "medium"] = Field(
+        "original", description="Image size variant to return in image_url (original, medium, thumb)"
+    )
 
     class Config:
         schema_extra = {
@@ -18,9 +21,24 @@ class PreviewRequest(BaseModel):
         }
 
 
+class PreviewBatchRequest(BaseModel):
+    """Request model for generating several daily previews at once"""
+    items: List[PreviewRequest] = Field(..., min_length=1, max_length=50, description="Previews to generate")
+
+    class Config:
+        schema_extra = {
+            "example": {"items": [
+                {"dish": "aloo paratha", "meal": "breakfast"},
+                {"dish": "rajma chawal", "meal": "lunch"}
+            ]}
+        }
+
+
 class PreviewMeta(BaseModel):
     model: str
     generated_at: str  # ISO datetime string
+    timings_ms: Optional[Dict[str, float]] = None  # per-stage generation time
+    fallbacks: Optional[List[str]] = None  # stages that timed out or failed
 
 
 class PreviewResponse(BaseModel):
@@ -28,6 +46,7 @@ class PreviewResponse(BaseModel):
     dish: str
     calories: int
     image_url: str
+    image_variants: Optional[Dict[str, str]] = None  # variant name -> URL
     captions: Dict[str, str]
     meta: PreviewMeta
 
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Query plan audit for the hot database queries
+
+Compiles each hot query with the builder its service executes, runs it through
+``EXPLAIN QUERY PLAN`` (``EXPLAIN`` on other backends) and flags full table
+scans. Run it directly against the configured database:
+
+    python query_plans.py
+"""
+
+from datetime import datetime, date
+from typing import Dict, List
+from sqlalchemy.engine import Engine
+
+from database import DailyRollup, DailyDishRollup
+from services.cache_service import cache_service
+from services.catalog_service import CatalogService
+from services.meal_history_service import MealHistoryService
+from services.meal_stats_service import MealStatsService
+from services.pagination import encode_cursor
+from services.rollup_service import RollupService
+
+
+def hot_queries() -> Dict[str, object]:
+    """Statements issued on every request path, keyed by a short name"""
+    now = datetime.utcnow()
+    start, end = datetime(2025, 1, 1), datetime(2025, 1, 7)
+    rollup_key = {'day': date(2025, 1, 1), 'meal_type': 'lunch'}
+    dish_rollup_key = {**rollup_key, 'dish_name': 'Aloo Paratha'}
+
+    return {
+        # CacheService getters and setters
+        'cache_lookup': cache_service._lookup_query('aloo paratha', 'preview'),
+        # CacheService.get_cached_many (batch previews, warmup)
+        'cache_lookup_many': cache_service._many_query(
+            ['aloo paratha', 'dal makhani'], ['image', 'captions']
+        ),
+        # CacheService.invalidate_cache
+        'cache_invalidate': cache_service._invalidate_query('aloo paratha'),
+        # CacheService.cleanup_expired_cache
+        'cache_cleanup_expired': cache_service._purge_query(now),
+        # /admin/user_meal
+        'user_meal_by_consumed_at': MealHistoryService.entry_query(now),
+        # MealStatsService.get_range_summary_from_meals
+        'user_meals_range': MealStatsService._meals_query(start, end),
+        # MealHistoryService.page (/api/user_meals)
+        'user_meals_page': MealHistoryService._query(
+            start=start,
+            cursor=encode_cursor(datetime(2025, 1, 5).isoformat(), 42)
+        ).limit(101),
+        # MealStatsService.get_range_summary (/api/weekly)
+        'daily_rollups_range': MealStatsService._rollup_query(start, end),
+        'daily_dish_rollups_range': MealStatsService._dish_rollup_query(start, end),
+        # CatalogService.refresh
+        'dishes_changed_since': CatalogService._changed_since_query(41),
+        # RollupService.apply_meal (the upsert's conflict target is the same unique index)
+        'daily_rollup_increment': RollupService._increment_query(
+            DailyRollup, rollup_key, {'calories_sum': 320, 'meal_count': 1}
+        ),
+        'daily_dish_rollup_increment': RollupService._increment_query(
+            DailyDishRollup, dish_rollup_key, {'meal_count': 1}
+        ),
+        'daily_dish_rollup_prune': RollupService._prune_query(DailyDishRollup, dish_rollup_key),
+    }
+
+
+def explain(engine: Engine, statement) -> List[str]:
+    """Plan lines for one statement on the given engine"""
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    if engine.dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + str(compiled), params).fetchall()
+
+    # SQLite: (id, parent, notused, detail); other backends: one text column
+    return [str(row[-1]) for row in rows]
+
+
+def is_full_scan(plan_line: str) -> bool:
+    """Whether a plan line reads a whole table instead of seeking an index"""
+    if plan_line.startswith("SCAN "):
+        # "SCAN t USING COVERING INDEX ..." still walks every row
+        return True
+    return "Seq Scan" in plan_line
+
+
+def audit(engine: Engine) -> Dict[str, Dict[str, object]]:
+    """
+    Explain every hot query
+
+    Args:
+        engine: Engine of a migrated database
+
+    Returns:
+        Mapping of query name to {'plan': [...], 'full_scan': bool}
+    """
+    report = {}
+    for name, statement in hot_queries().items():
+        plan = explain(engine, statement)
+        report[name] = {
+            'plan': plan,
+            'full_scan': any(is_full_scan(line) for line in plan)
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine, init_database
+
+    init_database()
+    report = audit(engine)
+
+    for name, result in report.items():
+        marker = "❌" if result['full_scan'] else "✅"
+        print(f"{marker} {name}")
+        for line in result['plan']:
+            print(f"     {line}")
+
+    sys.exit(1 if any(result['full_scan'] for result in report.values()) else 0)
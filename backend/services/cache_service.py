@@ -2,23 +2,245 @@
 Caching service for storing generated content
 """
 
+import os
 import json
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Callable, Awaitable
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database import Cache, get_db
+from sqlalchemy import select, delete, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import Cache, UPSERT_DIALECTS
+from .memory_cache import MemoryCache
 
 logger = logging.getLogger(__name__)
 
+# (normalized dish name, cache type, deserialized value, expires_at)
+CacheEntry = Tuple[str, str, Any, datetime]
+
+
+# Cache types the preview pipeline reads and writes
+CACHE_TYPES = ('preview', 'image', 'captions')
+
 
 class CacheService:
-    """Service for managing cached content"""
+    """
+    Service for managing cached content (in-memory LRU tier + SQLite tier)
+    
+    Stale-while-revalidate: an entry past expires_at but still inside its
+    cache type's grace window is served as is, and a background refresh is
+    scheduled through the registered refresher (at most one per key, at most
+    refresh_concurrency at a time). Entries past the grace window are misses.
+    """
     
-    def __init__(self, default_ttl_hours: int = 24):
+    def __init__(self, default_ttl_hours: int = 24, memory_max_entries: int = 512,
+                 grace_hours: Optional[Dict[str, float]] = None, refresh_concurrency: int = 4):
         self.default_ttl_hours = default_ttl_hours
+        self.memory = MemoryCache(max_entries=memory_max_entries)
+        self.db_hits = 0
+        self.db_misses = 0
+        
+        # Grace windows default to each cache type's own TTL
+        self.grace_hours = {
+            'preview': default_ttl_hours,
+            'image': default_ttl_hours * 7,
+            'captions': default_ttl_hours,
+            **(grace_hours or {})
+        }
+        self.refresher: Optional[Callable[[str, str], Awaitable[Any]]] = None
+        self._refreshing: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._refresh_semaphore = asyncio.Semaphore(refresh_concurrency)
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+    
+    def set_refresher(self, refresher: Callable[[str, str], Awaitable[Any]]):
+        """
+        Register the coroutine that regenerates and re-caches an entry
+        
+        Args:
+            refresher: Called as refresher(dish_name, cache_type)
+        """
+        self.refresher = refresher
+    
+    def _grace(self, cache_type: str) -> timedelta:
+        return timedelta(hours=self.grace_hours.get(cache_type, 0))
+    
+    def _memory_get(self, normalized_name: str, cache_type: str) -> Optional[Tuple[Any, Optional[datetime]]]:
+        """Look up the in-memory tier: (value, expires_at), possibly stale"""
+        return self.memory.get((normalized_name, cache_type))
+    
+    def _memory_set(self, normalized_name: str, cache_type: str, value: Any,
+                    expires_at: Optional[datetime]):
+        """Populate the in-memory tier with a deserialized value, kept until its grace window ends"""
+        memory_expires_at = expires_at + self._grace(cache_type) if expires_at else None
+        self.memory.set((normalized_name, cache_type), (value, expires_at), memory_expires_at)
+    
+    def _revalidate(self, dish_name: str, normalized_name: str, cache_type: str):
+        """Schedule a background refresh of a stale entry unless one is already running"""
+        key = (normalized_name, cache_type)
+        if self.refresher is None or key in self._refreshing:
+            return
+        
+        task = asyncio.ensure_future(self._refresh(dish_name, cache_type))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda done: self._refreshing.pop(key, None))
+    
+    async def _refresh(self, dish_name: str, cache_type: str):
+        async with self._refresh_semaphore:
+            try:
+                await self.refresher(dish_name, cache_type)
+                self.refreshes += 1
+                logger.info(f"🔄 Revalidated {cache_type} cache for '{dish_name}'")
+            except Exception as e:
+                self.refresh_failures += 1
+                logger.error(f"❌ Failed to revalidate {cache_type} cache for '{dish_name}': {e}")
     
-    async def get_cached_preview(self, dish_name: str, db: Session) -> Optional[Dict[str, Any]]:
+    async def _read(self, dish_name: str, cache_type: str, db: AsyncSession,
+                    delete_expired: bool = False) -> Optional[Any]:
+        """
+        Read one entry through both tiers, serving stale entries within grace
+        
+        Args:
+            dish_name: Name of the dish
+            cache_type: Cache type to read
+            db: Database session
+            delete_expired: Delete the row when it is past its grace window
+            
+        Returns:
+            The cached value or None
+        """
+        normalized_name = dish_name.lower().strip()
+        now = datetime.utcnow()
+        
+        # Memory tier first
+        cached = self._memory_get(normalized_name, cache_type)
+        if cached is not None:
+            value, expires_at = cached
+            if expires_at and expires_at < now:
+                self.stale_hits += 1
+                self._revalidate(dish_name, normalized_name, cache_type)
+            return value
+        
+        cache_entry = await self._db_lookup(normalized_name, cache_type, db)
+        if not cache_entry:
+            return None
+        
+        expires_at = cache_entry.expires_at
+        if expires_at and expires_at + self._grace(cache_type) < now:
+            if delete_expired:
+                logger.info(f"⏰ Cache expired for '{dish_name}', removing...")
+                await db.delete(cache_entry)
+                await db.commit()
+            return None
+        
+        value = json.loads(cache_entry.cache_data)
+        self._memory_set(normalized_name, cache_type, value, expires_at)
+        if expires_at and expires_at < now:
+            self.stale_hits += 1
+            self._revalidate(dish_name, normalized_name, cache_type)
+        return value
+    
+    @staticmethod
+    def _lookup_query(normalized_name: str, cache_type: str):
+        """SELECT for one cache row (served by ux_cache_dish_name_cache_type)"""
+        return select(Cache).where(
+            Cache.dish_name == normalized_name,
+            Cache.cache_type == cache_type
+        )
+    
+    @staticmethod
+    def _many_query(normalized_names: Iterable[str], cache_types: Iterable[str]):
+        """SELECT for every row of the given dishes and cache types"""
+        return select(Cache).where(
+            Cache.dish_name.in_(set(normalized_names)),
+            Cache.cache_type.in_(set(cache_types))
+        )
+    
+    @staticmethod
+    def _invalidate_query(normalized_name: str, cache_type: Optional[str] = None):
+        """DELETE for a dish's rows, optionally only of one cache type"""
+        statement = delete(Cache).where(Cache.dish_name == normalized_name)
+        if cache_type:
+            statement = statement.where(Cache.cache_type == cache_type)
+        return statement
+    
+    async def _db_lookup(self, normalized_name: str, cache_type: str, db: AsyncSession) -> Optional[Cache]:
+        """Fetch a cache row from the database tier and count the hit/miss"""
+        cache_entry = (await db.execute(
+            self._lookup_query(normalized_name, cache_type)
+        )).scalars().first()
+        
+        if cache_entry and (
+            not cache_entry.expires_at
+            or cache_entry.expires_at + self._grace(cache_type) > datetime.utcnow()
+        ):
+            self.db_hits += 1
+        else:
+            self.db_misses += 1
+        
+        return cache_entry
+    
+    def _expires_at(self, cache_type: str, ttl_hours: Optional[int] = None) -> datetime:
+        """Expiry time for a new entry of the given type"""
+        if ttl_hours:
+            ttl = ttl_hours
+        elif cache_type == 'image':
+            ttl = self.default_ttl_hours * 7  # Images last longer
+        else:
+            ttl = self.default_ttl_hours
+        return datetime.utcnow() + timedelta(hours=ttl)
+    
+    async def _write_entries(self, db: AsyncSession, entries: List[CacheEntry]):
+        """
+        Upsert cache rows in one statement and one commit
+        
+        Uses INSERT ... ON CONFLICT (dish_name, cache_type) DO UPDATE, backed by
+        the ux_cache_dish_name_cache_type unique index, so concurrent writers
+        never create duplicate rows. Other backends fall back to select-then-write.
+        """
+        now = datetime.utcnow()
+        rows = [
+            {
+                'dish_name': normalized_name,
+                'cache_type': cache_type,
+                'cache_data': json.dumps(value),
+                'created_at': now,
+                'expires_at': expires_at
+            }
+            for normalized_name, cache_type, value, expires_at in entries
+        ]
+        
+        insert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+        if insert is not None:
+            statement = insert(Cache).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Cache.dish_name, Cache.cache_type],
+                set_={
+                    'cache_data': statement.excluded.cache_data,
+                    'created_at': statement.excluded.created_at,
+                    'expires_at': statement.excluded.expires_at
+                }
+            )
+            await db.execute(statement)
+        else:
+            for row in rows:
+                existing_entry = (await db.execute(
+                    self._lookup_query(row['dish_name'], row['cache_type'])
+                )).scalars().first()
+                if existing_entry:
+                    existing_entry.cache_data = row['cache_data']
+                    existing_entry.created_at = row['created_at']
+                    existing_entry.expires_at = row['expires_at']
+                else:
+                    db.add(Cache(**row))
+        
+        await db.commit()
+        
+        for normalized_name, cache_type, value, expires_at in entries:
+            self._memory_set(normalized_name, cache_type, value, expires_at)
+    
+    async def get_cached_preview(self, dish_name: str, db: AsyncSession) -> Optional[Dict[str, Any]]:
         """
         Retrieve cached preview data for a dish
         
@@ -27,31 +249,14 @@ class CacheService:
             db: Database session
             
         Returns:
-            Cached preview data or None if not found/expired
+            Cached preview data (possibly stale, within grace) or None
         """
         try:
-            # Normalize dish name
-            normalized_name = dish_name.lower().strip()
-            
-            # Query cache
-            cache_entry = db.query(Cache).filter(
-                Cache.dish_name == normalized_name,
-                Cache.cache_type == 'preview'
-            ).first()
-            
-            if not cache_entry:
+            cached_data = await self._read(dish_name, 'preview', db, delete_expired=True)
+            if cached_data is None:
                 logger.info(f"📭 No cache entry found for '{dish_name}'")
                 return None
             
-            # Check if expired
-            if cache_entry.expires_at and cache_entry.expires_at < datetime.utcnow():
-                logger.info(f"⏰ Cache expired for '{dish_name}', removing...")
-                db.delete(cache_entry)
-                db.commit()
-                return None
-            
-            # Parse and return cached data
-            cached_data = json.loads(cache_entry.cache_data)
             logger.info(f"✅ Cache hit for '{dish_name}'")
             return cached_data
             
@@ -60,7 +265,7 @@ class CacheService:
             return None
     
     async def cache_preview(self, dish_name: str, preview_data: Dict[str, Any], 
-                          db: Session, ttl_hours: Optional[int] = None) -> bool:
+                          db: AsyncSession, ttl_hours: Optional[int] = None) -> bool:
         """
         Cache preview data for a dish
         
@@ -77,42 +282,18 @@ class CacheService:
             # Normalize dish name
             normalized_name = dish_name.lower().strip()
             
-            # Calculate expiry time
-            ttl = ttl_hours or self.default_ttl_hours
-            expires_at = datetime.utcnow() + timedelta(hours=ttl)
-            
-            # Check if entry already exists
-            existing_entry = db.query(Cache).filter(
-                Cache.dish_name == normalized_name,
-                Cache.cache_type == 'preview'
-            ).first()
-            
-            if existing_entry:
-                # Update existing entry
-                existing_entry.cache_data = json.dumps(preview_data)
-                existing_entry.expires_at = expires_at
-                existing_entry.created_at = datetime.utcnow()
-                logger.info(f"🔄 Updated cache for '{dish_name}'")
-            else:
-                # Create new entry
-                cache_entry = Cache(
-                    dish_name=normalized_name,
-                    cache_type='preview',
-                    cache_data=json.dumps(preview_data),
-                    expires_at=expires_at
-                )
-                db.add(cache_entry)
-                logger.info(f"💾 Cached preview for '{dish_name}'")
-            
-            db.commit()
+            expires_at = self._expires_at('preview', ttl_hours)
+            
+            await self._write_entries(db, [(normalized_name, 'preview', preview_data, expires_at)])
+            logger.info(f"💾 Cached preview for '{dish_name}'")
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to cache preview for '{dish_name}': {e}")
-            db.rollback()
+            await db.rollback()
             return False
     
-    async def get_cached_image(self, dish_name: str, db: Session) -> Optional[str]:
+    async def get_cached_image(self, dish_name: str, db: AsyncSession) -> Optional[str]:
         """
         Get cached image URL for a dish
         
@@ -123,26 +304,29 @@ class CacheService:
         Returns:
             Image URL or None if not cached
         """
-        try:
-            normalized_name = dish_name.lower().strip()
-            
-            cache_entry = db.query(Cache).filter(
-                Cache.dish_name == normalized_name,
-                Cache.cache_type == 'image'
-            ).first()
-            
-            if cache_entry and (not cache_entry.expires_at or cache_entry.expires_at > datetime.utcnow()):
-                image_data = json.loads(cache_entry.cache_data)
-                return image_data.get('image_url')
+        image_data = await self.get_cached_image_data(dish_name, db)
+        return image_data.get('image_url') if image_data else None
+    
+    async def get_cached_image_data(self, dish_name: str, db: AsyncSession) -> Optional[Dict[str, Any]]:
+        """
+        Get the cached image entry for a dish
+        
+        Args:
+            dish_name: Name of the dish
+            db: Database session
             
-            return None
+        Returns:
+            {'image_url', 'variants' (if stored), 'generated_at'} or None if not cached
+        """
+        try:
+            return await self._read(dish_name, 'image', db)
             
         except Exception as e:
             logger.error(f"❌ Failed to get cached image for '{dish_name}': {e}")
             return None
     
     async def cache_image(self, dish_name: str, image_url: str, 
-                         db: Session, ttl_hours: Optional[int] = None) -> bool:
+                         db: AsyncSession, ttl_hours: Optional[int] = None) -> bool:
         """
         Cache image URL for a dish
         
@@ -157,43 +341,23 @@ class CacheService:
         """
         try:
             normalized_name = dish_name.lower().strip()
-            ttl = ttl_hours or (self.default_ttl_hours * 7)  # Images last longer
-            expires_at = datetime.utcnow() + timedelta(hours=ttl)
+            expires_at = self._expires_at('image', ttl_hours)
             
             image_data = {
                 'image_url': image_url,
                 'generated_at': datetime.utcnow().isoformat()
             }
             
-            # Check for existing entry
-            existing_entry = db.query(Cache).filter(
-                Cache.dish_name == normalized_name,
-                Cache.cache_type == 'image'
-            ).first()
-            
-            if existing_entry:
-                existing_entry.cache_data = json.dumps(image_data)
-                existing_entry.expires_at = expires_at
-                existing_entry.created_at = datetime.utcnow()
-            else:
-                cache_entry = Cache(
-                    dish_name=normalized_name,
-                    cache_type='image',
-                    cache_data=json.dumps(image_data),
-                    expires_at=expires_at
-                )
-                db.add(cache_entry)
-            
-            db.commit()
+            await self._write_entries(db, [(normalized_name, 'image', image_data, expires_at)])
             logger.info(f"💾 Cached image for '{dish_name}': {image_url}")
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to cache image for '{dish_name}': {e}")
-            db.rollback()
+            await db.rollback()
             return False
     
-    async def get_cached_captions(self, dish_name: str, db: Session) -> Optional[Dict[str, str]]:
+    async def get_cached_captions(self, dish_name: str, db: AsyncSession) -> Optional[Dict[str, str]]:
         """
         Get cached captions for a dish
         
@@ -205,24 +369,88 @@ class CacheService:
             Dictionary with bhai and formal captions or None
         """
         try:
-            normalized_name = dish_name.lower().strip()
-            
-            cache_entry = db.query(Cache).filter(
-                Cache.dish_name == normalized_name,
-                Cache.cache_type == 'captions'
-            ).first()
-            
-            if cache_entry and (not cache_entry.expires_at or cache_entry.expires_at > datetime.utcnow()):
-                return json.loads(cache_entry.cache_data)
-            
-            return None
+            return await self._read(dish_name, 'captions', db)
             
         except Exception as e:
             logger.error(f"❌ Failed to get cached captions for '{dish_name}': {e}")
             return None
     
+    async def get_cached_many(self, dish_names: Iterable[str], cache_types: Iterable[str],
+                              db: AsyncSession, allow_stale: bool = True) -> Dict[Tuple[str, str], Any]:
+        """
+        Look up several dishes and cache types at once
+        
+        The memory tier answers what it can; everything else is fetched in one
+        query. Rows past their grace window are skipped (cleanup_expired_cache
+        removes them).
+        
+        Args:
+            dish_names: Names of the dishes
+            cache_types: Cache types to fetch for each dish (e.g. 'preview', 'image')
+            db: Database session
+            allow_stale: Serve (and revalidate) stale entries; if False they count as missing
+            
+        Returns:
+            Mapping of (normalized dish name, cache type) to the cached value
+        """
+        names = {dish_name.lower().strip(): dish_name for dish_name in dish_names}
+        cache_types = set(cache_types)
+        found: Dict[Tuple[str, str], Any] = {}
+        stale = []
+        now = datetime.utcnow()
+        
+        missing = set()
+        for normalized_name in names:
+            for cache_type in cache_types:
+                cached = self._memory_get(normalized_name, cache_type)
+                if cached is None:
+                    missing.add((normalized_name, cache_type))
+                    continue
+                value, expires_at = cached
+                if expires_at and expires_at < now:
+                    if not allow_stale:
+                        continue
+                    stale.append((normalized_name, cache_type))
+                found[(normalized_name, cache_type)] = value
+        
+        if missing:
+            try:
+                cache_entries = (await db.execute(
+                    self._many_query(
+                        (name for name, _ in missing),
+                        (cache_type for _, cache_type in missing)
+                    )
+                )).scalars().all()
+                
+                hits = 0
+                for cache_entry in cache_entries:
+                    key = (cache_entry.dish_name, cache_entry.cache_type)
+                    expires_at = cache_entry.expires_at
+                    if key not in missing or (expires_at and expires_at + self._grace(key[1]) < now):
+                        continue
+                    value = json.loads(cache_entry.cache_data)
+                    self._memory_set(key[0], key[1], value, expires_at)
+                    hits += 1
+                    if expires_at and expires_at < now:
+                        if not allow_stale:
+                            continue
+                        stale.append(key)
+                    found[key] = value
+                
+                self.db_hits += hits
+                self.db_misses += len(missing) - hits
+                
+            except Exception as e:
+                logger.error(f"❌ Failed to look up {len(missing)} cache entries: {e}")
+        
+        for normalized_name, cache_type in stale:
+            self.stale_hits += 1
+            self._revalidate(names[normalized_name], normalized_name, cache_type)
+        
+        return found
+    
     async def cache_captions(self, dish_name: str, captions: Dict[str, str], 
-                           db: Session, ttl_hours: Optional[int] = None) -> bool:
+                           db: AsyncSession, ttl_hours: Optional[int] = None) -> bool:
         """
         Cache captions for a dish
         
@@ -237,38 +465,66 @@ class CacheService:
         """
         try:
             normalized_name = dish_name.lower().strip()
-            ttl = ttl_hours or self.default_ttl_hours
-            expires_at = datetime.utcnow() + timedelta(hours=ttl)
-            
-            # Check for existing entry
-            existing_entry = db.query(Cache).filter(
-                Cache.dish_name == normalized_name,
-                Cache.cache_type == 'captions'
-            ).first()
-            
-            if existing_entry:
-                existing_entry.cache_data = json.dumps(captions)
-                existing_entry.expires_at = expires_at
-                existing_entry.created_at = datetime.utcnow()
-            else:
-                cache_entry = Cache(
-                    dish_name=normalized_name,
-                    cache_type='captions',
-                    cache_data=json.dumps(captions),
-                    expires_at=expires_at
-                )
-                db.add(cache_entry)
-            
-            db.commit()
+            expires_at = self._expires_at('captions', ttl_hours)
+            
+            await self._write_entries(db, [(normalized_name, 'captions', captions, expires_at)])
             logger.info(f"💾 Cached captions for '{dish_name}'")
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to cache captions for '{dish_name}': {e}")
-            db.rollback()
+            await db.rollback()
             return False
     
-    async def invalidate_cache(self, dish_name: str, db: Session, 
+    async def cache_artifacts(self, dish_name: str, db: AsyncSession,
+                              preview_data: Optional[Dict[str, Any]] = None,
+                              image_url: Optional[str] = None,
+                              captions: Optional[Dict[str, str]] = None,
+                              image_variants: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Cache any of a dish's preview, image and captions in one transaction
+        
+        Args:
+            dish_name: Name of the dish
+            db: Database session
+            preview_data: Preview data to cache (skipped if None)
+            image_url: URL of the generated image (skipped if None)
+            image_variants: Size variant name -> URL, stored with the image
+            captions: Dictionary with bhai and formal captions (skipped if None)
+            
+        Returns:
+            True if cached successfully (or nothing to cache)
+        """
+        try:
+            normalized_name = dish_name.lower().strip()
+            entries: List[CacheEntry] = []
+            
+            if preview_data is not None:
+                entries.append((normalized_name, 'preview', preview_data, self._expires_at('preview')))
+            if image_url is not None:
+                image_data = {
+                    'image_url': image_url,
+                    'generated_at': datetime.utcnow().isoformat()
+                }
+                if image_variants:
+                    image_data['variants'] = image_variants
+                entries.append((normalized_name, 'image', image_data, self._expires_at('image')))
+            if captions is not None:
+                entries.append((normalized_name, 'captions', captions, self._expires_at('captions')))
+            
+            if not entries:
+                return True
+            
+            await self._write_entries(db, entries)
+            logger.info(f"💾 Cached {', '.join(entry[1] for entry in entries)} for '{dish_name}'")
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Failed to cache artifacts for '{dish_name}': {e}")
+            await db.rollback()
+            return False
+    
+    async def invalidate_cache(self, dish_name: str, db: AsyncSession, 
                              cache_type: Optional[str] = None) -> int:
         """
         Clear cache for a specific dish
@@ -284,25 +540,43 @@ class CacheService:
         try:
             normalized_name = dish_name.lower().strip()
             
-            query = db.query(Cache).filter(Cache.dish_name == normalized_name)
+            deleted_count = (await db.execute(
+                self._invalidate_query(normalized_name, cache_type)
+            )).rowcount
+            await db.commit()
             
-            if cache_type:
-                query = query.filter(Cache.cache_type == cache_type)
-            
-            deleted_count = query.delete()
-            db.commit()
+            self.memory.delete_where(
+                lambda key: key[0] == normalized_name and (cache_type is None or key[1] == cache_type)
+            )
             
             logger.info(f"🗑️ Cleared {deleted_count} cache entries for '{dish_name}'")
             return deleted_count
             
         except Exception as e:
             logger.error(f"❌ Failed to clear cache for '{dish_name}': {e}")
-            db.rollback()
+            await db.rollback()
             return 0
     
-    async def cleanup_expired_cache(self, db: Session) -> int:
+    def _purge_query(self, now: datetime):
+        """DELETE for entries past their cache type's grace window"""
+        return delete(Cache).where(and_(
+            # Range on ix_cache_expires_at; the per-type grace is checked on the matches
+            Cache.expires_at < now,
+            or_(
+                *(
+                    and_(Cache.cache_type == cache_type, Cache.expires_at < now - self._grace(cache_type))
+                    for cache_type in CACHE_TYPES
+                ),
+                Cache.cache_type.notin_(CACHE_TYPES)
+            )
+        ))
+    
+    async def cleanup_expired_cache(self, db: AsyncSession) -> int:
         """
-        Remove all expired cache entries
+        Remove cache entries that are past their grace window
+        
+        Stale entries still inside it are kept so they can be served while
+        they are revalidated.
         
         Args:
             db: Database session
@@ -311,11 +585,11 @@ class CacheService:
             Number of expired entries removed
         """
         try:
-            deleted_count = db.query(Cache).filter(
-                Cache.expires_at < datetime.utcnow()
-            ).delete()
+            deleted_count = (await db.execute(
+                self._purge_query(datetime.utcnow())
+            )).rowcount
             
-            db.commit()
+            await db.commit()
             
             if deleted_count > 0:
                 logger.info(f"🧹 Cleaned up {deleted_count} expired cache entries")
@@ -324,10 +598,10 @@ class CacheService:
             
         except Exception as e:
             logger.error(f"❌ Failed to cleanup expired cache: {e}")
-            db.rollback()
+            await db.rollback()
             return 0
     
-    def get_cache_stats(self, db: Session) -> Dict[str, Any]:
+    async def get_cache_stats(self, db: AsyncSession) -> Dict[str, Any]:
         """
         Get cache statistics
         
@@ -338,17 +612,21 @@ class CacheService:
             Dictionary with cache statistics
         """
         try:
-            total_entries = db.query(Cache).count()
-            
             # Count by type
-            preview_count = db.query(Cache).filter(Cache.cache_type == 'preview').count()
-            image_count = db.query(Cache).filter(Cache.cache_type == 'image').count()
-            caption_count = db.query(Cache).filter(Cache.cache_type == 'captions').count()
+            type_counts = dict((await db.execute(
+                select(Cache.cache_type, func.count(Cache.id)).group_by(Cache.cache_type)
+            )).all())
+            total_entries = sum(type_counts.values())
+            preview_count = type_counts.get('preview', 0)
+            image_count = type_counts.get('image', 0)
+            caption_count = type_counts.get('captions', 0)
+            
+            # Count expired (stale entries within grace are included)
+            expired_count = (await db.execute(
+                select(func.count(Cache.id)).where(Cache.expires_at < datetime.utcnow())
+            )).scalar_one()
             
-            # Count expired
-            expired_count = db.query(Cache).filter(
-                Cache.expires_at < datetime.utcnow()
-            ).count()
+            db_lookups = self.db_hits + self.db_misses
             
             return {
                 'total_entries': total_entries,
@@ -358,7 +636,22 @@ class CacheService:
                     'captions': caption_count
                 },
                 'expired_entries': expired_count,
-                'active_entries': total_entries - expired_count
+                'active_entries': total_entries - expired_count,
+                'revalidation': {
+                    'grace_hours': self.grace_hours,
+                    'stale_hits': self.stale_hits,
+                    'refreshes': self.refreshes,
+                    'refresh_failures': self.refresh_failures,
+                    'in_flight': len(self._refreshing)
+                },
+                'tiers': {
+                    'memory': self.memory.stats(),
+                    'database': {
+                        'hits': self.db_hits,
+                        'misses': self.db_misses,
+                        'hit_rate': round(self.db_hits / db_lookups, 4) if db_lookups else 0.0
+                    }
+                }
             }
             
         except Exception as e:
@@ -367,4 +660,13 @@ class CacheService:
 
 
 # Global cache service instance
-cache_service = CacheService()
\ No newline at end of file
+cache_service = CacheService(
+    default_ttl_hours=int(os.getenv("CACHE_TTL_HOURS") or 24),
+    memory_max_entries=int(os.getenv("CACHE_MEMORY_MAX_ENTRIES") or 512),
+    grace_hours={
+        cache_type: float(os.getenv(f"CACHE_GRACE_HOURS_{cache_type.upper()}"))
+        for cache_type in CACHE_TYPES
+        if os.getenv(f"CACHE_GRACE_HOURS_{cache_type.upper()}")
+    },
+    refresh_concurrency=int(os.getenv("CACHE_REFRESH_CONCURRENCY") or 4)
+)
\ No newline at end of file
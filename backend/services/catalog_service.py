@@ -0,0 +1,283 @@
+"""
+Dish catalog backed by the dishes table, served from a versioned in-memory snapshot
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Dish, CatalogState, AsyncSessionLocal, populate_dishes_from_csv
+from .dish_matcher import DishMatcher
+from .nutrition_table import NutritionTable
+from .nutrition_service import nutrition_service
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DISH_COLUMNS = (
+    Dish.id, Dish.name, Dish.calories, Dish.meal_type,
+    Dish.protein_g, Dish.carbs_g, Dish.fat_g, Dish.description
+)
+
+
+class CatalogSnapshot:
+    """Immutable catalog state: the table, its matcher and the version it reflects"""
+
+    __slots__ = ('version', 'table', 'matcher', 'loaded_at')
+
+    def __init__(self, version: int, table: NutritionTable, matcher: DishMatcher):
+        self.version = version
+        self.table = table
+        self.matcher = matcher
+        self.loaded_at = datetime.utcnow()
+
+
+def _table_from_rows(rows: List[tuple]) -> NutritionTable:
+    """Build a NutritionTable from (id, name, calories, meal_type, protein, carbs, fat, description) rows"""
+    columns = list(zip(*rows)) if rows else [[] for _ in DISH_COLUMNS]
+    ids, names, calories, meal_types, protein_g, carbs_g, fat_g, descriptions = columns
+    return NutritionTable(
+        names=names, calories=calories, meal_types=meal_types,
+        protein_g=protein_g, carbs_g=carbs_g, fat_g=fat_g,
+        descriptions=descriptions, ids=ids
+    )
+
+
+def _table_rows(table: NutritionTable) -> List[tuple]:
+    """Inverse of _table_from_rows, used to merge changed dishes into a snapshot"""
+    return [
+        (table.ids[record.id], record.dish_name, record.calories, record.meal_type,
+         record.protein_g, record.carbs_g, record.fat_g, record.description)
+        for record in table
+    ]
+
+
+class CatalogService:
+    """
+    Single source of truth for the dish catalog.
+
+    The dishes table is loaded once into a CatalogSnapshot that feeds both the
+    nutrition matcher (/api/preview, /api/compare) and the /api/dishes listing.
+    Every dish write bumps catalog_state.version and stamps the row with it;
+    refreshing only fetches dishes whose revision is newer than the snapshot,
+    and workers check the counter at most once per refresh interval.
+
+    Snapshots are copy-on-write: a new table and matcher are built in a worker
+    thread and published with one reference swap, so in-flight lookups keep the
+    snapshot they started with and request handling never waits on a rebuild.
+    """
+
+    def __init__(self, refresh_interval: float = 5.0, csv_path: str = "data/nutrition_lookup.csv"):
+        self.refresh_interval = refresh_interval
+        self.csv_path = Path(csv_path)
+        self.snapshot: Optional[CatalogSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._reload_flight = SingleFlight("catalog-reload")
+        self._watcher: Optional[asyncio.Task] = None
+        self.full_loads = 0
+        self.incremental_refreshes = 0
+        self.csv_reloads = 0
+
+    @staticmethod
+    async def _current_version(db: AsyncSession) -> int:
+        version = (await db.execute(
+            select(CatalogState.version).where(CatalogState.id == 1)
+        )).scalar_one_or_none()
+        return version or 0
+
+    @staticmethod
+    async def bump_version(db: AsyncSession) -> int:
+        """
+        Increment the catalog version inside the caller's transaction
+
+        Stamp the written Dish rows with the returned version before committing.
+        """
+        await db.execute(
+            update(CatalogState)
+            .where(CatalogState.id == 1)
+            .values(version=CatalogState.version + 1, updated_at=datetime.utcnow())
+        )
+        return (await db.execute(
+            select(CatalogState.version).where(CatalogState.id == 1)
+        )).scalar_one()
+
+    @staticmethod
+    def _changed_since_query(version: int):
+        """
+        SELECT for dishes written after the given catalog version
+
+        Unordered so it seeks ix_dishes_revision; ORDER BY id would make SQLite
+        walk the whole table in primary key order instead. Sort the rows by id.
+        """
+        return select(*DISH_COLUMNS).where(Dish.revision > version)
+
+    def _install(self, snapshot: CatalogSnapshot):
+        """Swap in a new snapshot everywhere it is served from"""
+        self.snapshot = snapshot
+        nutrition_service.install(snapshot.table, snapshot.matcher)
+
+    @staticmethod
+    def _build_snapshot(version: int, table: NutritionTable) -> CatalogSnapshot:
+        matcher = DishMatcher.build((name, dish_id) for dish_id, name in enumerate(table.names))
+        # Serialize /api/dishes here, off the event loop, rather than on first request
+        table.dish_list_json()
+        return CatalogSnapshot(version, table, matcher)
+
+    def _merge_snapshot(self, current: CatalogSnapshot, version: int,
+                        changed: List[tuple]) -> CatalogSnapshot:
+        """New snapshot with changed dishes replaced in place (by database id) and new ones appended"""
+        rows = _table_rows(current.table)
+        positions = {row[0]: position for position, row in enumerate(rows)}
+        for row in changed:
+            if row[0] in positions:
+                rows[positions[row[0]]] = row
+            else:
+                positions[row[0]] = len(rows)
+                rows.append(row)
+        return self._build_snapshot(version, _table_from_rows(rows))
+
+    async def load(self, db: AsyncSession) -> CatalogSnapshot:
+        """
+        Load the whole catalog from the database
+
+        Args:
+            db: Database session
+
+        Returns:
+            The installed snapshot
+        """
+        async with self._lock:
+            version = await self._current_version(db)
+            rows = (await db.execute(select(*DISH_COLUMNS).order_by(Dish.id))).all()
+
+            snapshot = await asyncio.to_thread(
+                self._build_snapshot, version, _table_from_rows([tuple(row) for row in rows])
+            )
+            self._install(snapshot)
+            self._checked_at = time.monotonic()
+            self.full_loads += 1
+
+            logger.info(f"✅ Loaded dish catalog v{version} ({len(snapshot.table)} dishes)")
+            return snapshot
+
+    async def refresh(self, db: AsyncSession) -> CatalogSnapshot:
+        """
+        Bring the snapshot up to date, fetching only dishes changed since its version
+
+        Args:
+            db: Database session
+
+        Returns:
+            The current snapshot
+        """
+        if self.snapshot is None:
+            return await self.load(db)
+
+        async with self._lock:
+            self._checked_at = time.monotonic()
+            current = self.snapshot
+            version = await self._current_version(db)
+            if version == current.version:
+                return current
+
+            changed = sorted((await db.execute(self._changed_since_query(current.version))).all())
+
+            snapshot = await asyncio.to_thread(
+                self._merge_snapshot, current, version, [tuple(row) for row in changed]
+            )
+            self._install(snapshot)
+            self.incremental_refreshes += 1
+
+            logger.info(f"🔄 Refreshed dish catalog v{current.version} -> v{version} ({len(changed)} changed)")
+            return snapshot
+
+    async def refresh_if_stale(self, db: AsyncSession) -> CatalogSnapshot:
+        """
+        Refresh when the snapshot was last checked over refresh_interval ago
+
+        Never waits on a refresh already in progress: the current snapshot is
+        served until the new one is published.
+        """
+        if self.snapshot is None:
+            return await self.refresh(db)
+        if self._lock.locked() or time.monotonic() - self._checked_at < self.refresh_interval:
+            return self.snapshot
+        return await self.refresh(db)
+
+    async def _reload_from_csv(self) -> Dict[str, Any]:
+        counts = await asyncio.to_thread(populate_dishes_from_csv, str(self.csv_path))
+        if not counts:
+            # populate_dishes_from_csv logs and swallows its errors
+            raise RuntimeError(f"Could not import {self.csv_path}")
+        async with AsyncSessionLocal() as db:
+            snapshot = await self.refresh(db)
+        self.csv_reloads += 1
+        return {**counts, 'version': snapshot.version, 'dishes': len(snapshot.table)}
+
+    async def reload_from_csv(self) -> Dict[str, Any]:
+        """
+        Import the catalog CSV into the dishes table and publish the new snapshot
+
+        Concurrent triggers (admin endpoint, file watcher) share one reload.
+
+        Returns:
+            Import counts plus the published version and dish count
+        """
+        return await self._reload_flight.do('csv', self._reload_from_csv)
+
+    async def _watch_csv(self, interval: float):
+        """Poll the CSV's mtime and reload when it changes"""
+        last_mtime = self.csv_path.stat().st_mtime if self.csv_path.exists() else None
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = self.csv_path.stat().st_mtime if self.csv_path.exists() else None
+                if mtime is not None and mtime != last_mtime:
+                    last_mtime = mtime
+                    logger.info(f"📝 {self.csv_path} changed, reloading catalog...")
+                    await self.reload_from_csv()
+            except Exception as e:
+                logger.error(f"❌ Catalog reload from {self.csv_path} failed: {e}")
+
+    def start_watcher(self, interval: float):
+        """Start watching the catalog CSV (interval in seconds; 0 disables)"""
+        if interval > 0 and self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_csv(interval))
+            logger.info(f"👀 Watching {self.csv_path} for catalog changes every {interval}s")
+
+    async def stop_watcher(self):
+        """Stop the CSV watcher if it is running"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot version, size and refresh counters"""
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'dishes': len(snapshot.table) if snapshot else 0,
+            'loaded_at': snapshot.loaded_at.isoformat() if snapshot else None,
+            'full_loads': self.full_loads,
+            'incremental_refreshes': self.incremental_refreshes,
+            'csv_reloads': self.csv_reloads,
+            'watching': self._watcher is not None
+        }
+
+
+# Global catalog service instance
+catalog_service = CatalogService(
+    refresh_interval=float(os.getenv("CATALOG_REFRESH_SECONDS") or 5),
+    csv_path=os.getenv("CATALOG_CSV_PATH") or "data/nutrition_lookup.csv"
+)
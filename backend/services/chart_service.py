@@ -1,39 +1,285 @@
 """
 Chart generation service using matplotlib
+
+Rendering uses the object-oriented Figure API (no pyplot global state) and
+runs in a process pool, so charts never block the event loop and several can
+render in parallel across cores.
 """
 
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
+import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
-from datetime import datetime, timedelta
-import numpy as np
+from datetime import datetime, timedelta, date
+from .single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# Bump when the rendering code changes so cached charts are re-rendered
+CHART_RENDER_VERSION = 1
+CHART_DPI = 150
+
+
+# ----- Render functions (run inside worker processes; must stay module-level) -----
+
+def _new_figure(figsize: Tuple[float, float]):
+    """Create a standalone Agg figure without touching pyplot state"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _save_figure(fig, filepath: str):
+    """Save a figure atomically (write to a temp name, then rename)"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".", suffix=".part")
+    os.close(fd)
+    try:
+        fig.tight_layout()
+        fig.savefig(tmp_path, format='png', dpi=CHART_DPI, bbox_inches='tight',
+                    facecolor='white', edgecolor='none')
+        os.replace(tmp_path, filepath)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def _render_weekly_chart(filepath: str, labels: List[str], calories: List[float],
+                         start_date: str, end_date: str) -> str:
+    """Render the weekly calorie bar chart"""
+    fig = _new_figure((12, 6))
+    ax = fig.add_subplot(111)
+    positions = list(range(len(labels)))
+
+    # Bar chart
+    bars = ax.bar(positions, calories,
+                  color='#ff6b6b', alpha=0.8, edgecolor='#d63031', linewidth=1)
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels)
+
+    # Customize chart
+    ax.set_title(f'Weekly Calorie Consumption\n{start_date} to {end_date}',
+                 fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('Day of Week', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Calories', fontsize=12, fontweight='bold')
+
+    # Add value labels on bars
+    for bar, value in zip(bars, calories):
+        if value > 0:
+            ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 20,
+                    f'{int(value)}', ha='center', va='bottom', fontweight='bold')
+
+    # Add average line
+    avg_calories = sum(calories) / len(calories) if calories else 0
+    if avg_calories > 0:
+        ax.axhline(y=avg_calories, color='#00b894', linestyle='--',
+                   linewidth=2, alpha=0.8, label=f'Average: {int(avg_calories)} cal')
+        ax.legend()
+
+    # Styling
+    ax.grid(True, alpha=0.3, axis='y')
+    ax.set_ylim(0, max(max(calories, default=0) * 1.1, 100))
+
+    # Remove top and right spines
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    _save_figure(fig, filepath)
+    return filepath
+
+
+def _render_empty_chart(filepath: str, labels: List[str], start_date: str, end_date: str) -> str:
+    """Render the chart shown when no meals were recorded"""
+    fig = _new_figure((12, 6))
+    ax = fig.add_subplot(111)
+    positions = list(range(len(labels)))
+
+    ax.bar(positions, [0] * len(labels), color='#ddd', alpha=0.5)
+    ax.set_xticks(positions)
+    ax.set_xticklabels(labels)
+
+    ax.set_title(f'Weekly Calorie Consumption\n{start_date} to {end_date}\n(No data recorded)',
+                 fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel('Day of Week', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Calories', fontsize=12, fontweight='bold')
+    ax.set_ylim(0, 100)
+
+    # Add message
+    ax.text(0.5, 0.5, 'No meal data recorded for this period',
+            transform=ax.transAxes, ha='center', va='center',
+            fontsize=14, style='italic', color='#666')
+
+    ax.grid(True, alpha=0.3, axis='y')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+
+    _save_figure(fig, filepath)
+    return filepath
+
+
+def _render_meal_distribution_chart(filepath: str, meal_types: List[str],
+                                    calories: List[float]) -> str:
+    """Render the meal type distribution pie chart"""
+    fig = _new_figure((8, 8))
+    ax = fig.add_subplot(111)
+
+    colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57']
+    wedges, texts, autotexts = ax.pie(calories,
+                                      labels=meal_types,
+                                      autopct='%1.1f%%',
+                                      colors=colors,
+                                      startangle=90,
+                                      explode=[0.05] * len(calories))
+
+    ax.set_title('Calorie Distribution by Meal Type',
+                 fontsize=16, fontweight='bold', pad=20)
+
+    # Enhance text
+    for autotext in autotexts:
+        autotext.set_color('white')
+        autotext.set_fontweight('bold')
+
+    _save_figure(fig, filepath)
+    return filepath
+
+
+def _render_error_chart(filepath: str) -> str:
+    """Render the error placeholder chart"""
+    fig = _new_figure((8, 6))
+    ax = fig.add_subplot(111)
+
+    ax.text(0.5, 0.5, '📊 Chart Generation Error\nPlease try again later',
+            transform=ax.transAxes, ha='center', va='center',
+            fontsize=16, fontweight='bold', color='#e74c3c')
+
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.axis('off')
+
+    _save_figure(fig, filepath)
+    return filepath
+
 
 class ChartService:
     """Service for generating charts and visualizations"""
     
-    def __init__(self, charts_dir: str = "data/images"):
+    def __init__(self, charts_dir: str = "data/images", max_workers: Optional[int] = None,
+                 superseded_grace_seconds: int = 300):
         self.charts_dir = Path(charts_dir)
         self.charts_dir.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or min(2, os.cpu_count() or 1)
+        self.superseded_grace_seconds = superseded_grace_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._render_flight = SingleFlight("chart-render")
+        self.cache_hits = 0
+        self.renders = 0
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the render process pool on first use"""
+        if self._executor is None:
+            # spawn: never fork a process that already runs an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"✅ Chart render pool started ({self.max_workers} processes)")
+        return self._executor
+    
+    async def _render(self, fn, *args) -> str:
+        """Run a render function in the process pool, falling back to a thread if the pool is unusable"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        except (BrokenProcessPool, OSError, NotImplementedError) as e:
+            logger.warning(f"⚠️ Chart render pool unavailable ({e}), rendering in a thread")
+            self.shutdown()
+            # The Figure API keeps no global state, so a thread is safe too
+            return await asyncio.to_thread(fn, *args)
+    
+    def shutdown(self):
+        """Stop the render process pool (called on app shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    @staticmethod
+    def _chart_key(kind: str, **params) -> str:
+        """Deterministic key for a chart: hash of its data series plus render parameters"""
+        payload = json.dumps(
+            {'kind': kind, 'version': CHART_RENDER_VERSION, 'dpi': CHART_DPI, **params},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+    
+    async def _cached_render(self, filename: str, prefix: str, fn, *args) -> str:
+        """
+        Return the chart URL, rendering only if no chart with this key exists yet
+        
+        Concurrent requests for the same chart share one render. After a new
+        render, older charts with the same prefix (superseded data) are removed.
+        """
+        filepath = self.charts_dir / filename
+        chart_url = f"/data/images/{filename}"
+        
+        if filepath.exists():
+            self.cache_hits += 1
+            logger.info(f"♻️ Reusing cached chart: {chart_url}")
+            return chart_url
+        
+        async def render():
+            if not filepath.exists():
+                await self._render(fn, str(filepath), *args)
+                self.renders += 1
+                self.cleanup_superseded(prefix, keep=filename)
+            return chart_url
         
-        # Set style
-        plt.style.use('default')
-        sns.set_palette("husl")
+        return await self._render_flight.do(filename, render)
     
-    async def generate_weekly_chart(self, meal_data: List[Dict[str, Any]], 
+    def cleanup_superseded(self, prefix: str, keep: str) -> int:
+        """
+        Delete charts sharing a prefix (same chart kind and range) other than keep
+        
+        Files younger than superseded_grace_seconds are left alone so clients
+        that were just handed the previous URL can still load it.
+        """
+        removed = 0
+        cutoff = time.time() - self.superseded_grace_seconds
+        for path in self.charts_dir.glob(f"{prefix}*.png"):
+            if path.name == keep:
+                continue
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.info(f"🧹 Removed {removed} superseded chart(s) for '{prefix}'")
+        return removed
+    
+    @staticmethod
+    def _date_range(start_date: str, end_date: str) -> List[date]:
+        start_dt = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end_dt = datetime.strptime(end_date, '%Y-%m-%d').date()
+        return [start_dt + timedelta(days=i) for i in range((end_dt - start_dt).days + 1)]
+    
+    async def generate_weekly_chart(self, daily_calories: Dict[str, float], 
                                   start_date: str, end_date: str) -> str:
         """
         Generate weekly calorie consumption chart
         
         Args:
-            meal_data: List of meal consumption data
+            daily_calories: Calories per day keyed by 'YYYY-MM-DD' (missing days count as 0)
             start_date: Start date string (YYYY-MM-DD)
             end_date: End date string (YYYY-MM-DD)
             
@@ -41,79 +287,31 @@ class ChartService:
             Path to generated chart image
         """
         try:
-            # Create filename
-            timestamp = int(datetime.now().timestamp())
-            filename = f"weekly_chart_{start_date}_{end_date}_{timestamp}.png"
-            filepath = self.charts_dir / filename
+            prefix = f"weekly_chart_{start_date}_{end_date}_"
+            days = self._date_range(start_date, end_date)
+            labels = [d.strftime('%a') for d in days]
             
             # Process data
-            if not meal_data:
+            if not daily_calories:
                 # Create empty chart
-                return await self._create_empty_chart(filepath, start_date, end_date)
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(meal_data)
-            df['consumed_at'] = pd.to_datetime(df['consumed_at'])
-            df['date'] = df['consumed_at'].dt.date
-            
-            # Group by date and sum calories
-            daily_calories = df.groupby('date')['calories'].sum().reset_index()
-            
-            # Create date range for the week
-            start_dt = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_dt = datetime.strptime(end_date, '%Y-%m-%d').date()
-            
-            date_range = pd.date_range(start=start_dt, end=end_dt, freq='D')
-            date_df = pd.DataFrame({'date': date_range.date})
-            
-            # Merge with actual data
-            chart_data = date_df.merge(daily_calories, on='date', how='left')
-            chart_data['calories'] = chart_data['calories'].fillna(0)
-            chart_data['day_name'] = pd.to_datetime(chart_data['date']).dt.strftime('%a')
-            
-            # Create the chart
-            fig, ax = plt.subplots(figsize=(12, 6))
-            
-            # Bar chart
-            bars = ax.bar(chart_data['day_name'], chart_data['calories'], 
-                         color='#ff6b6b', alpha=0.8, edgecolor='#d63031', linewidth=1)
-            
-            # Customize chart
-            ax.set_title(f'Weekly Calorie Consumption\n{start_date} to {end_date}', 
-                        fontsize=16, fontweight='bold', pad=20)
-            ax.set_xlabel('Day of Week', fontsize=12, fontweight='bold')
-            ax.set_ylabel('Calories', fontsize=12, fontweight='bold')
-            
-            # Add value labels on bars
-            for bar, calories in zip(bars, chart_data['calories']):
-                if calories > 0:
-                    ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 20,
-                           f'{int(calories)}', ha='center', va='bottom', fontweight='bold')
-            
-            # Add average line
-            avg_calories = chart_data['calories'].mean()
-            if avg_calories > 0:
-                ax.axhline(y=avg_calories, color='#00b894', linestyle='--', 
-                          linewidth=2, alpha=0.8, label=f'Average: {int(avg_calories)} cal')
-                ax.legend()
-            
-            # Styling
-            ax.grid(True, alpha=0.3, axis='y')
-            ax.set_ylim(0, max(chart_data['calories'].max() * 1.1, 100))
-            
-            # Remove top and right spines
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            
-            plt.tight_layout()
-            
-            # Save chart
-            plt.savefig(filepath, dpi=150, bbox_inches='tight', 
-                       facecolor='white', edgecolor='none')
-            plt.close()
-            
-            chart_url = f"/data/images/{filename}"
-            logger.info(f"✅ Generated weekly chart: {chart_url}")
+                key = self._chart_key('weekly_empty', start=start_date, end=end_date, labels=labels)
+                return await self._cached_render(
+                    f"{prefix}{key}.png", prefix,
+                    _render_empty_chart, labels, start_date, end_date
+                )
+            
+            # Fill missing days with 0
+            calories = [float(daily_calories.get(d.isoformat(), 0)) for d in days]
+            
+            # Same series + same render parameters -> same file, no re-render
+            key = self._chart_key('weekly', start=start_date, end=end_date,
+                                  labels=labels, calories=calories)
+            chart_url = await self._cached_render(
+                f"{prefix}{key}.png", prefix,
+                _render_weekly_chart, labels, calories, start_date, end_date
+            )
+            
+            logger.info(f"✅ Weekly chart ready: {chart_url}")
             return chart_url
             
         except Exception as e:
@@ -134,109 +332,34 @@ class ChartService:
             if not meal_data:
                 return await self._create_error_chart()
             
-            # Create filename
-            timestamp = int(datetime.now().timestamp())
-            filename = f"meal_distribution_{timestamp}.png"
-            filepath = self.charts_dir / filename
+            # Sum calories per meal type
+            meal_calories: Dict[str, float] = {}
+            for meal in meal_data:
+                meal_calories[meal['meal_type']] = meal_calories.get(meal['meal_type'], 0) + meal['calories']
+            meal_types = sorted(meal_calories)
+            calories = [float(meal_calories[m]) for m in meal_types]
             
-            # Process data
-            df = pd.DataFrame(meal_data)
-            meal_calories = df.groupby('meal_type')['calories'].sum()
-            
-            # Create pie chart
-            fig, ax = plt.subplots(figsize=(8, 8))
-            
-            colors = ['#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57']
-            wedges, texts, autotexts = ax.pie(meal_calories.values, 
-                                             labels=meal_calories.index,
-                                             autopct='%1.1f%%',
-                                             colors=colors,
-                                             startangle=90,
-                                             explode=[0.05] * len(meal_calories))
-            
-            ax.set_title('Calorie Distribution by Meal Type', 
-                        fontsize=16, fontweight='bold', pad=20)
-            
-            # Enhance text
-            for autotext in autotexts:
-                autotext.set_color('white')
-                autotext.set_fontweight('bold')
-            
-            plt.tight_layout()
+            key = self._chart_key('meal_distribution', meal_types=meal_types, calories=calories)
+            chart_url = await self._cached_render(
+                f"meal_distribution_{key}.png", "meal_distribution_",
+                _render_meal_distribution_chart, meal_types, calories
+            )
             
-            # Save chart
-            plt.savefig(filepath, dpi=150, bbox_inches='tight',
-                       facecolor='white', edgecolor='none')
-            plt.close()
-            
-            chart_url = f"/data/images/{filename}"
-            logger.info(f"✅ Generated meal distribution chart: {chart_url}")
+            logger.info(f"✅ Meal distribution chart ready: {chart_url}")
             return chart_url
             
         except Exception as e:
             logger.error(f"❌ Failed to generate meal distribution chart: {e}")
             return await self._create_error_chart()
     
-    async def _create_empty_chart(self, filepath: Path, start_date: str, end_date: str) -> str:
-        """Create chart for empty data"""
-        try:
-            fig, ax = plt.subplots(figsize=(12, 6))
-            
-            # Create empty bars for each day
-            start_dt = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_dt = datetime.strptime(end_date, '%Y-%m-%d').date()
-            
-            date_range = pd.date_range(start=start_dt, end=end_dt, freq='D')
-            day_names = [d.strftime('%a') for d in date_range]
-            
-            ax.bar(day_names, [0] * len(day_names), color='#ddd', alpha=0.5)
-            
-            ax.set_title(f'Weekly Calorie Consumption\n{start_date} to {end_date}\n(No data recorded)', 
-                        fontsize=16, fontweight='bold', pad=20)
-            ax.set_xlabel('Day of Week', fontsize=12, fontweight='bold')
-            ax.set_ylabel('Calories', fontsize=12, fontweight='bold')
-            ax.set_ylim(0, 100)
-            
-            # Add message
-            ax.text(0.5, 0.5, 'No meal data recorded for this period', 
-                   transform=ax.transAxes, ha='center', va='center',
-                   fontsize=14, style='italic', color='#666')
-            
-            ax.grid(True, alpha=0.3, axis='y')
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            
-            plt.tight_layout()
-            plt.savefig(filepath, dpi=150, bbox_inches='tight',
-                       facecolor='white', edgecolor='none')
-            plt.close()
-            
-            return f"/data/images/{filepath.name}"
-            
-        except Exception as e:
-            logger.error(f"❌ Failed to create empty chart: {e}")
-            return await self._create_error_chart()
-    
     async def _create_error_chart(self) -> str:
         """Create error placeholder chart"""
         try:
             filename = "chart_error_placeholder.png"
             filepath = self.charts_dir / filename
             
-            fig, ax = plt.subplots(figsize=(8, 6))
-            
-            ax.text(0.5, 0.5, '📊 Chart Generation Error\nPlease try again later', 
-                   transform=ax.transAxes, ha='center', va='center',
-                   fontsize=16, fontweight='bold', color='#e74c3c')
-            
-            ax.set_xlim(0, 1)
-            ax.set_ylim(0, 1)
-            ax.axis('off')
-            
-            plt.tight_layout()
-            plt.savefig(filepath, dpi=150, bbox_inches='tight',
-                       facecolor='white', edgecolor='none')
-            plt.close()
+            if not filepath.exists():
+                await self._render(_render_error_chart, str(filepath))
             
             return f"/data/images/{filename}"
             
@@ -246,4 +369,7 @@ class ChartService:
 
 
 # Global chart service instance
-chart_service = ChartService()
\ No newline at end of file
+chart_service = ChartService(
+    max_workers=int(os.getenv("CHART_RENDER_WORKERS") or 0) or None,
+    superseded_grace_seconds=int(os.getenv("CHART_SUPERSEDED_GRACE_SECONDS") or 300)
+)
@@ -0,0 +1,145 @@
+"""
+In-process dish name matcher backed by a trigram inverted index
+"""
+
+import heapq
+import logging
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+from fuzzywuzzy import fuzz
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_dish_name(name: str) -> str:
+    """Normalize a dish name for indexing and lookup"""
+    return " ".join(str(name).lower().split())
+
+
+def _trigrams(text: str) -> set:
+    """Split a normalized name into padded character trigrams"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DishMatcher:
+    """
+    Fuzzy dish matcher that only scores plausible candidates.
+
+    At build time every dish name is split into character trigrams and an
+    inverted index (trigram -> dish ids) is created. A lookup collects the
+    dishes sharing the most trigrams with the query and runs the fuzzy scorer
+    on that short candidate list only, so the cost of a match no longer grows
+    linearly with the size of the catalog. Shared trigrams only approximate
+    the fuzzy score, so when no candidate reaches the caller's min_score the
+    search widens to the fallback_candidates best by overlap (never the whole
+    catalog, which would make every unknown dish a linear scan again).
+    """
+
+    def __init__(self, max_candidates: int = 25, fallback_candidates: int = 500):
+        self.max_candidates = max_candidates
+        self.fallback_candidates = max(fallback_candidates, max_candidates)
+        self.names: List[str] = []
+        self.records: Dict[str, Any] = {}
+        self._index: Dict[str, List[int]] = {}
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[str, Any]], max_candidates: int = 25,
+              fallback_candidates: int = 500) -> "DishMatcher":
+        """
+        Build a matcher from (dish_name, record) pairs
+
+        Args:
+            items: Iterable of dish names and the record to return for each
+            max_candidates: Number of index candidates passed to the scorer
+            fallback_candidates: Candidates scored when none of the first reach min_score
+
+        Returns:
+            Ready to use DishMatcher
+        """
+        matcher = cls(max_candidates=max_candidates, fallback_candidates=fallback_candidates)
+        index = defaultdict(list)
+
+        for name, record in items:
+            normalized = normalize_dish_name(name)
+            if not normalized or normalized in matcher.records:
+                continue
+
+            dish_id = len(matcher.names)
+            matcher.names.append(normalized)
+            matcher.records[normalized] = record
+
+            for gram in _trigrams(normalized):
+                index[gram].append(dish_id)
+
+        matcher._index = dict(index)
+        logger.info(f"✅ Built dish matcher index ({len(matcher.names)} dishes, {len(matcher._index)} trigrams)")
+        return matcher
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get(self, dish_name: str) -> Optional[Any]:
+        """Exact (normalized) name lookup"""
+        return self.records.get(normalize_dish_name(dish_name))
+
+    def _candidates(self, normalized: str, limit: int) -> List[int]:
+        """Return up to limit dish ids sharing the most trigrams with the query, most first"""
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in _trigrams(normalized):
+            for dish_id in self._index.get(gram, ()):
+                overlap[dish_id] += 1
+
+        return heapq.nlargest(limit, overlap, key=overlap.get)
+
+    def _score(self, normalized: str, dish_ids: Iterable[int],
+               scorer: Callable[[str, str], int]) -> List[Tuple[str, int, Any]]:
+        """Score dishes against the query, best first"""
+        scored = []
+        for dish_id in dish_ids:
+            name = self.names[dish_id]
+            scored.append((name, scorer(normalized, name), self.records[name]))
+
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+    def extract(self, query: str, scorer: Callable[[str, str], int] = fuzz.ratio,
+                limit: int = 1, min_score: Optional[int] = None) -> List[Tuple[str, int, Any]]:
+        """
+        Find the best scoring dishes for a query
+
+        Args:
+            query: Dish name to search for
+            scorer: fuzzywuzzy style scorer (0-100)
+            limit: Maximum number of results
+            min_score: Score up to fallback_candidates dishes if no candidate reaches it
+
+        Returns:
+            List of (matched_name, score, record) sorted by score
+        """
+        normalized = normalize_dish_name(query)
+        if not normalized or not self.names:
+            return []
+
+        # Exact hits skip scoring entirely
+        if limit == 1 and normalized in self.records:
+            return [(normalized, 100, self.records[normalized])]
+
+        wide = min_score is not None and self.fallback_candidates > self.max_candidates
+        candidates = self._candidates(normalized, self.fallback_candidates if wide else self.max_candidates)
+        scored = self._score(normalized, candidates[:self.max_candidates], scorer)
+
+        if wide and len(candidates) > self.max_candidates and (not scored or scored[0][1] < min_score):
+            # The best fuzzy match may share few trigrams with the query
+            scored = sorted(
+                scored + self._score(normalized, candidates[self.max_candidates:], scorer),
+                key=lambda item: item[1], reverse=True
+            )
+
+        return scored[:limit]
+
+    def extract_one(self, query: str, scorer: Callable[[str, str], int] = fuzz.ratio,
+                    min_score: Optional[int] = None) -> Optional[Tuple[str, int, Any]]:
+        """Return the single best (matched_name, score, record) or None"""
+        matches = self.extract(query, scorer=scorer, limit=1, min_score=min_score)
+        return matches[0] if matches else None
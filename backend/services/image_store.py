@@ -0,0 +1,158 @@
+"""
+Content-addressed image store with pre-rendered size variants
+"""
+
+import os
+import asyncio
+import logging
+import tempfile
+from typing import Optional, Dict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Optional AVIF support (pip install pillow-avif-plugin)
+try:
+    import pillow_avif  # noqa: F401 - registers the AVIF codec with Pillow
+except ImportError:
+    pillow_avif = None
+
+
+class ImageStore:
+    """
+    Stores generated images by the SHA-256 of their bytes.
+
+    Originals live at ``data/images/cas/<h[:2]>/<h>.png``, so identical
+    artifacts are written once. WebP (and AVIF when the Pillow plugin is
+    installed) thumbnails and mid-size variants are rendered once at ingest
+    time next to the original as ``<h>_<variant>.<ext>``.
+    """
+
+    VARIANT_SIZES = {
+        'thumb': 256,
+        'medium': 512,
+    }
+
+    def __init__(self, root_dir: str = "data/images/cas", url_prefix: str = "/data/images/cas"):
+        self.root_dir = Path(root_dir)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.formats = {'webp': 'WEBP'}
+        if self._avif_available():
+            self.formats['avif'] = 'AVIF'
+
+    @staticmethod
+    def _avif_available() -> bool:
+        try:
+            from PIL import Image
+            return 'AVIF' in Image.SAVE
+        except Exception:
+            return False
+
+    def _relative_path(self, digest: str, suffix: str = "", ext: str = "png") -> str:
+        return f"{digest[:2]}/{digest}{suffix}.{ext}"
+
+    def _variant_names(self) -> Dict[str, tuple]:
+        """Map variant name -> (size, extension)"""
+        names = {}
+        for variant, size in self.VARIANT_SIZES.items():
+            for ext in self.formats:
+                name = variant if ext == 'webp' else f"{variant}_{ext}"
+                names[name] = (variant, ext)
+        return names
+
+    def _digest_from_url(self, image_url: Optional[str]) -> Optional[str]:
+        """Extract the content hash from an original image URL, if it is one of ours"""
+        if not image_url or not image_url.startswith(self.url_prefix + "/"):
+            return None
+        stem = Path(image_url).stem
+        if len(stem) != 64 or '_' in stem:
+            return None
+        return stem
+
+    async def ingest(self, tmp_path: Path, digest: str) -> str:
+        """
+        Move a freshly written image into the store
+
+        Args:
+            tmp_path: Temp file holding the image (same filesystem as the store)
+            digest: Hex SHA-256 of the file contents
+
+        Returns:
+            URL of the stored original
+        """
+        relative = self._relative_path(digest)
+        dest = self.root_dir / relative
+
+        if dest.exists():
+            # Identical artifact already stored: drop the duplicate
+            tmp_path.unlink(missing_ok=True)
+            logger.info(f"♻️ Deduplicated image {digest[:12]}")
+        else:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, dest)
+
+        if not all((self.root_dir / self._relative_path(digest, f"_{variant}", ext)).exists()
+                   for variant, ext in self._variant_names().values()):
+            await asyncio.to_thread(self._render_variants, dest, digest)
+
+        return f"{self.url_prefix}/{relative}"
+
+    def _render_variants(self, original: Path, digest: str):
+        """Render the downscaled variants of an original (runs in a worker thread)"""
+        from PIL import Image
+
+        try:
+            with Image.open(original) as img:
+                img = img.convert('RGB')
+                for variant, size in self.VARIANT_SIZES.items():
+                    resized = img.copy()
+                    resized.thumbnail((size, size), Image.LANCZOS)
+
+                    for ext, pil_format in self.formats.items():
+                        dest = self.root_dir / self._relative_path(digest, f"_{variant}", ext)
+                        if dest.exists():
+                            continue
+                        fd, tmp_name = tempfile.mkstemp(dir=dest.parent, suffix=".part")
+                        os.close(fd)
+                        try:
+                            resized.save(tmp_name, format=pil_format, quality=80)
+                            os.replace(tmp_name, dest)
+                        except Exception:
+                            Path(tmp_name).unlink(missing_ok=True)
+                            raise
+
+            logger.info(f"✅ Rendered image variants for {digest[:12]} ({', '.join(self.formats)})")
+        except Exception as e:
+            logger.error(f"❌ Failed to render image variants for {digest[:12]}: {e}")
+
+    def variant_urls(self, image_url: Optional[str]) -> Dict[str, str]:
+        """
+        All available URLs for an image
+
+        Checks the filesystem, so resolve this once when an image is generated
+        and keep the result with the cached image rather than per request.
+
+        Args:
+            image_url: URL of the original image
+
+        Returns:
+            Mapping of variant name ('original', 'medium', 'thumb', ...) to URL
+        """
+        if not image_url:
+            return {}
+
+        urls = {'original': image_url}
+        digest = self._digest_from_url(image_url)
+        if digest is None:
+            return urls
+
+        for name, (variant, ext) in self._variant_names().items():
+            relative = self._relative_path(digest, f"_{variant}", ext)
+            if (self.root_dir / relative).exists():
+                urls[name] = f"{self.url_prefix}/{relative}"
+        return urls
+
+
+# Global image store instance
+image_store = ImageStore()
@@ -0,0 +1,167 @@
+"""
+Cursor-paginated and streamed meal history for /api/user_meals
+"""
+
+import logging
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
+from datetime import datetime, timedelta
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import UserMeal, AsyncSessionLocal
+from .pagination import encode_cursor, decode_cursor, ndjson
+
+logger = logging.getLogger(__name__)
+
+MEAL_COLUMNS = (UserMeal.id, UserMeal.dish_name, UserMeal.meal_type, UserMeal.calories, UserMeal.consumed_at)
+
+
+def _meal_dict(row) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "dish_name": row.dish_name,
+        "meal_type": row.meal_type,
+        "calories": row.calories,
+        "consumed_at": row.consumed_at.isoformat() if row.consumed_at else None
+    }
+
+
+class MealHistoryService:
+    """
+    Reads user meals newest first, keyset-paginated on (consumed_at, id).
+
+    Pages seek past the previous page's last row through the consumed_at
+    index instead of using OFFSET, so every page costs the same however deep
+    the client has scrolled. Streaming fetches rows in yield_per batches.
+
+    Meals without a timestamp have no place in the keyset: the unpaginated,
+    undated history lists them after all others, and pages and date ranges
+    leave them out (as in the /api/weekly totals).
+    """
+
+    def __init__(self, stream_batch_size: int = 500):
+        self.stream_batch_size = stream_batch_size
+
+    @staticmethod
+    def _query(start: Optional[datetime] = None, end: Optional[datetime] = None,
+               meal_type: Optional[str] = None, cursor: Optional[str] = None,
+               untimed: bool = False):
+        """
+        SELECT for one filtered, ordered slice of the history
+
+        Args:
+            start: First day to include (midnight)
+            end: Last day to include (midnight; the whole day is included)
+            meal_type: Only meals of this type
+            cursor: Resume after the row this cursor was issued for
+            untimed: Also list meals without a timestamp, after all others
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = select(*MEAL_COLUMNS)
+        if not untimed:
+            query = query.where(UserMeal.consumed_at.isnot(None))
+
+        if start is not None:
+            query = query.where(UserMeal.consumed_at >= start)
+        if end is not None:
+            query = query.where(UserMeal.consumed_at < end + timedelta(days=1))
+        if meal_type:
+            query = query.where(UserMeal.meal_type == meal_type)
+
+        if cursor:
+            try:
+                consumed_at, meal_id = decode_cursor(cursor)
+                consumed_at, meal_id = datetime.fromisoformat(consumed_at), int(meal_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid cursor: {cursor!r}")
+
+            # Row-value comparison lets the index walk stop at the LIMIT (an OR sorts)
+            query = query.where(tuple_(UserMeal.consumed_at, UserMeal.id) < (consumed_at, meal_id))
+
+        newest_first = UserMeal.consumed_at.desc()
+        if untimed:
+            newest_first = newest_first.nulls_last()
+        return query.order_by(newest_first, UserMeal.id.desc())
+
+    @staticmethod
+    def _lists_untimed(limit: Optional[int], filters: Dict[str, Any]) -> bool:
+        """Meals without a timestamp are only listed in the whole, undated history"""
+        return limit is None and not any(filters.get(key) for key in ("start", "end", "cursor"))
+
+    @staticmethod
+    def entry_query(consumed_at: datetime):
+        """SELECT for the meal logged at an exact time (/admin/user_meal upserts on it)"""
+        return select(UserMeal).where(UserMeal.consumed_at == consumed_at)
+
+    async def page(self, db: AsyncSession, limit: Optional[int] = None,
+                   **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of meals
+
+        Args:
+            db: Database session
+            limit: Maximum number of meals (None returns the whole selection)
+            **filters: start, end, meal_type and cursor (see _query)
+
+        Returns:
+            (meals, next_cursor); next_cursor is None on the last page
+        """
+        query = self._query(untimed=self._lists_untimed(limit, filters), **filters)
+        if limit is not None:
+            # One extra row tells whether another page exists
+            query = query.limit(limit + 1)
+        rows = (await db.execute(query)).all()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.consumed_at.isoformat(), last.id)
+        return [_meal_dict(row) for row in rows], next_cursor
+
+    async def stream_ndjson(self, db: AsyncSession, limit: Optional[int] = None,
+                            **filters) -> Tuple[AsyncIterator[bytes], Optional[str]]:
+        """
+        Meals as newline-delimited JSON, fetched in batches
+
+        The query is built (and the cursor validated) before anything is sent;
+        rows are read through a session of its own while the response streams.
+        With a limit, the page's last key is looked up first so the next
+        cursor can go out in the headers, and the stream stops at that key.
+
+        Args:
+            db: Database session for the page boundary lookup
+            limit: Maximum number of meals (None streams the whole selection)
+            **filters: start, end, meal_type and cursor (see _query)
+
+        Returns:
+            (NDJSON chunks, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = self._query(untimed=self._lists_untimed(limit, filters), **filters)
+        if limit is None:
+            return self._stream(query), None
+
+        boundary = (await db.execute(
+            query.with_only_columns(UserMeal.consumed_at, UserMeal.id).offset(limit - 1).limit(2)
+        )).all()
+        if len(boundary) < 2:
+            return self._stream(query.limit(limit)), None
+
+        last = boundary[0]
+        query = query.where(tuple_(UserMeal.consumed_at, UserMeal.id) >= (last.consumed_at, last.id))
+        return self._stream(query), encode_cursor(last.consumed_at.isoformat(), last.id)
+
+    async def _stream(self, query) -> AsyncIterator[bytes]:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query.execution_options(yield_per=self.stream_batch_size))
+            async for rows in result.partitions():
+                yield ndjson(_meal_dict(row) for row in rows)
+
+
+# Global meal history service instance
+meal_history_service = MealHistoryService()
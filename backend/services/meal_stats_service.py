@@ -0,0 +1,129 @@
+"""
+Aggregated meal statistics computed in SQL
+"""
+
+import logging
+from typing import Dict, Any
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import UserMeal, DailyRollup, DailyDishRollup
+
+logger = logging.getLogger(__name__)
+
+
+class MealStatsService:
+    """Computes range summaries for /api/weekly without loading UserMeal rows"""
+
+    @staticmethod
+    def _summarize(daily_calories: Dict[str, int], dish_counts: Dict[str, int],
+                   meal_count: int) -> Dict[str, Any]:
+        """Build the summary dictionary shared by both aggregation sources"""
+        if dish_counts:
+            # Highest count wins; ties go to the alphabetically first dish
+            most_consumed_dish, most_consumed_count = min(
+                dish_counts.items(), key=lambda item: (-item[1], item[0])
+            )
+        else:
+            most_consumed_dish, most_consumed_count = None, 0
+
+        return {
+            'daily_calories': daily_calories,
+            'total_calories': sum(daily_calories.values()),
+            'meal_count': meal_count,
+            'unique_dishes': len(dish_counts),
+            'most_consumed_dish': most_consumed_dish,
+            'most_consumed_count': most_consumed_count
+        }
+
+    @staticmethod
+    def _rollup_query(start_date: datetime, end_date: datetime):
+        """SELECT for the daily_rollups rows of a range (inclusive)"""
+        return select(
+            DailyRollup.day,
+            DailyRollup.calories_sum,
+            DailyRollup.meal_count
+        ).where(
+            DailyRollup.day >= start_date.date(),
+            DailyRollup.day <= end_date.date()
+        )
+
+    @staticmethod
+    def _dish_rollup_query(start_date: datetime, end_date: datetime):
+        """SELECT for per-dish meal counts over a range (inclusive)"""
+        return select(
+            DailyDishRollup.dish_name,
+            func.sum(DailyDishRollup.meal_count)
+        ).where(
+            DailyDishRollup.day >= start_date.date(),
+            DailyDishRollup.day <= end_date.date()
+        ).group_by(DailyDishRollup.dish_name)
+
+    @staticmethod
+    def _meals_query(start_date: datetime, end_date: datetime):
+        """SELECT grouping a range of user_meals by (day, dish)"""
+        day = func.date(UserMeal.consumed_at)
+        return select(
+            day.label('day'),
+            UserMeal.dish_name,
+            func.count(UserMeal.id).label('meal_count'),
+            func.sum(UserMeal.calories).label('calories')
+        ).where(
+            UserMeal.consumed_at >= start_date,
+            UserMeal.consumed_at < end_date + timedelta(days=1)
+        ).group_by(day, UserMeal.dish_name)
+
+    async def get_range_summary(self, db: AsyncSession, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """
+        Summarize meals between two dates (inclusive) from the rollup tables
+
+        Reads one row per day and meal type, and one per dish eaten in the
+        range, whatever the raw meal volume.
+
+        Args:
+            db: Database session
+            start_date: First day of the range
+            end_date: Last day of the range (included)
+
+        Returns:
+            Dictionary with daily_calories (YYYY-MM-DD -> calories), total_calories,
+            meal_count, unique_dishes, most_consumed_dish and most_consumed_count
+        """
+        rows = (await db.execute(self._rollup_query(start_date, end_date))).all()
+        dish_counts = dict((await db.execute(self._dish_rollup_query(start_date, end_date))).all())
+
+        daily_calories: Dict[str, int] = {}
+        meal_count = 0
+
+        for row in rows:
+            day_key = row.day.isoformat()
+            daily_calories[day_key] = daily_calories.get(day_key, 0) + row.calories_sum
+            meal_count += row.meal_count
+
+        return self._summarize(daily_calories, dish_counts, meal_count)
+
+    async def get_range_summary_from_meals(self, db: AsyncSession, start_date: datetime,
+                                     end_date: datetime) -> Dict[str, Any]:
+        """
+        Same summary computed directly from user_meals in one round trip
+
+        The database groups by (day, dish) so only one small row per dish per
+        day crosses the wire. Used to verify the rollups.
+        """
+        rows = (await db.execute(self._meals_query(start_date, end_date))).all()
+
+        daily_calories: Dict[str, int] = {}
+        dish_counts: Dict[str, int] = {}
+        meal_count = 0
+
+        for row in rows:
+            day_key = str(row.day)
+            daily_calories[day_key] = daily_calories.get(day_key, 0) + int(row.calories or 0)
+            dish_counts[row.dish_name] = dish_counts.get(row.dish_name, 0) + row.meal_count
+            meal_count += row.meal_count
+
+        return self._summarize(daily_calories, dish_counts, meal_count)
+
+
+# Global meal stats service instance
+meal_stats_service = MealStatsService()
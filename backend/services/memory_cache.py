@@ -0,0 +1,88 @@
+"""
+In-process LRU cache tier used in front of the SQLite cache table
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, Any, Hashable, Tuple
+
+
+class MemoryCache:
+    """
+    Size-bounded LRU cache holding already deserialized objects.
+
+    Every entry carries its own expiry (mirroring ``Cache.expires_at``) so the
+    memory tier never serves data the database tier would consider expired.
+    Values are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[datetime]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at and expires_at < datetime.utcnow():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[datetime] = None):
+        """Store a value, evicting the least recently used entries when full"""
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove a single key"""
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def delete_where(self, predicate) -> int:
+        """Remove every key for which predicate(key) is true"""
+        with self._lock:
+            doomed = [key for key in self._entries if predicate(key)]
+            for key in doomed:
+                del self._entries[key]
+            return len(doomed)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this tier"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
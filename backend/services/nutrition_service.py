@@ -2,11 +2,12 @@
 Nutrition lookup service with fuzzy matching
 """
 
-import pandas as pd
 import logging
-from typing import Optional, Dict, Any, List
-from fuzzywuzzy import fuzz, process
+from typing import Optional, Dict, Any, List, Tuple
+from fuzzywuzzy import fuzz
 from pathlib import Path
+from .dish_matcher import DishMatcher
+from .nutrition_table import NutritionTable, DishRecord
 
 logger = logging.getLogger(__name__)
 
@@ -14,11 +15,35 @@ logger = logging.getLogger(__name__)
 class NutritionService:
     """Service for nutrition data lookup with fuzzy matching"""
     
-    def __init__(self, csv_path: str = "data/nutrition_lookup.csv"):
+    def __init__(self, csv_path: str = "data/nutrition_lookup.csv", autoload: bool = True):
         self.csv_path = Path(csv_path)
-        self.df = None
-        self.dish_names = []
-        self._load_nutrition_data()
+        # (table, matcher) swapped as one object so a lookup never mixes snapshots
+        self._catalog: Optional[Tuple[NutritionTable, DishMatcher]] = None
+        if autoload:
+            self._load_nutrition_data()
+    
+    @property
+    def table(self) -> Optional[NutritionTable]:
+        return self._catalog[0] if self._catalog else None
+    
+    @property
+    def matcher(self) -> Optional[DishMatcher]:
+        return self._catalog[1] if self._catalog else None
+    
+    def install(self, table: NutritionTable, matcher: Optional[DishMatcher] = None):
+        """
+        Serve lookups from a new catalog table
+        
+        Args:
+            table: Catalog to use from now on
+            matcher: Matcher over the table's names (built if None)
+        """
+        if matcher is None:
+            # The matcher maps names to dish ids in the table
+            matcher = DishMatcher.build(
+                (name, dish_id) for dish_id, name in enumerate(table.names)
+            )
+        self._catalog = (table, matcher)
     
     def _load_nutrition_data(self):
         """Load nutrition data from CSV file"""
@@ -27,15 +52,18 @@ class NutritionService:
                 logger.error(f"❌ Nutrition CSV file not found: {self.csv_path}")
                 return
             
-            self.df = pd.read_csv(self.csv_path)
-            self.dish_names = self.df['dish_name'].str.lower().tolist()
-            
-            logger.info(f"✅ Loaded {len(self.df)} dishes from nutrition database")
+            self.install(NutritionTable.from_csv(self.csv_path))
+            logger.info(f"✅ Loaded {len(self.table)} dishes from nutrition database")
             
         except Exception as e:
+            # A failed reload keeps serving the previous catalog
             logger.error(f"❌ Failed to load nutrition data: {e}")
-            self.df = None
-            self.dish_names = []
+    
+    def _current(self) -> Optional[Tuple[NutritionTable, DishMatcher]]:
+        """Current catalog, loading the CSV on first use if none was installed"""
+        if self._catalog is None:
+            self._load_nutrition_data()
+        return self._catalog
     
     def fuzzy_match_dish(self, dish_name: str, threshold: int = 70) -> Optional[Dict[str, Any]]:
         """
@@ -48,41 +76,39 @@ class NutritionService:
         Returns:
             Dictionary with dish data or None if no match found
         """
-        if self.df is None or not self.dish_names:
+        return self._match(self._current(), dish_name, threshold)
+    
+    @staticmethod
+    def _match(catalog: Optional[Tuple[NutritionTable, DishMatcher]], dish_name: str,
+               threshold: int) -> Optional[Dict[str, Any]]:
+        """fuzzy_match_dish against one catalog snapshot"""
+        if catalog is None or not len(catalog[1]):
             logger.warning("⚠️ Nutrition data not available")
             return None
         
+        table, matcher = catalog
+        
         try:
-            # Normalize input
-            normalized_dish = dish_name.lower().strip()
-            
-            # Find best match using fuzzy matching
-            best_match = process.extractOne(
-                normalized_dish, 
-                self.dish_names,
-                scorer=fuzz.ratio
-            )
+            # Score the indexed candidates (the whole catalog if none reaches the threshold)
+            best_match = matcher.extract_one(dish_name, scorer=fuzz.ratio, min_score=threshold)
             
             if best_match and best_match[1] >= threshold:
-                matched_name = best_match[0]
-                confidence = best_match[1]
-                
-                # Get the row data
-                row = self.df[self.df['dish_name'].str.lower() == matched_name].iloc[0]
+                _, confidence, dish_id = best_match
+                row: DishRecord = table.record(dish_id)
                 
                 result = {
                     'original_query': dish_name,
-                    'matched_name': row['dish_name'],
+                    'matched_name': row.dish_name,
                     'confidence': confidence,
-                    'calories': int(row['calories']),
-                    'meal_type': row['meal_type'],
-                    'protein_g': float(row['protein_g']) if pd.notna(row['protein_g']) else None,
-                    'carbs_g': float(row['carbs_g']) if pd.notna(row['carbs_g']) else None,
-                    'fat_g': float(row['fat_g']) if pd.notna(row['fat_g']) else None,
-                    'description': row['description'] if pd.notna(row['description']) else None
+                    'calories': row.calories,
+                    'meal_type': row.meal_type,
+                    'protein_g': row.protein_g,
+                    'carbs_g': row.carbs_g,
+                    'fat_g': row.fat_g,
+                    'description': row.description
                 }
                 
-                logger.info(f"✅ Matched '{dish_name}' to '{row['dish_name']}' (confidence: {confidence}%)")
+                logger.info(f"✅ Matched '{dish_name}' to '{row.dish_name}' (confidence: {confidence}%)")
                 return result
             
             else:
@@ -123,8 +149,26 @@ class NutritionService:
         Returns:
             Complete dish information dictionary
         """
-        match = self.fuzzy_match_dish(dish_name)
+        return self._dish_info(dish_name, self.fuzzy_match_dish(dish_name))
+    
+    def get_dish_infos(self, dish_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get complete dish information for many dishes from one catalog snapshot
         
+        Args:
+            dish_names: Names of dishes
+            
+        Returns:
+            Mapping of each distinct name to its get_dish_info() dictionary
+        """
+        catalog = self._current()
+        return {
+            dish_name: self._dish_info(dish_name, self._match(catalog, dish_name, 70))
+            for dish_name in dict.fromkeys(dish_names)
+        }
+    
+    def _dish_info(self, dish_name: str, match: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """A fuzzy match, or estimated data when nothing matched"""
         if match:
             return match
         else:
@@ -152,27 +196,26 @@ class NutritionService:
         Returns:
             List of matching dishes
         """
-        if self.df is None:
+        catalog = self._current()
+        if catalog is None:
             return []
         
+        table, matcher = catalog
+        
         try:
-            # Get fuzzy matches
-            matches = process.extract(
-                query.lower(),
-                self.dish_names,
+            # Get fuzzy matches from the indexed candidates
+            matches = matcher.extract(
+                query,
                 scorer=fuzz.partial_ratio,
-                limit=limit
+                limit=limit,
+                min_score=50
             )
             
             results = []
-            for match_name, score in matches:
+            for _, score, dish_id in matches:
                 if score >= 50:  # Lower threshold for search
-                    row = self.df[self.df['dish_name'].str.lower() == match_name].iloc[0]
                     results.append({
-                        'name': row['dish_name'],
-                        'calories': int(row['calories']),
-                        'meal_type': row['meal_type'],
-                        'description': row['description'] if pd.notna(row['description']) else None,
+                        **table.dish_list()[dish_id],
                         'match_score': score
                     })
             
@@ -184,19 +227,13 @@ class NutritionService:
     
     def get_all_dishes(self) -> List[Dict[str, Any]]:
         """Get all dishes in the database"""
-        if self.df is None:
+        catalog = self._current()
+        if catalog is None:
             return []
         
         try:
-            return [
-                {
-                    'name': row['dish_name'],
-                    'calories': int(row['calories']),
-                    'meal_type': row['meal_type'],
-                    'description': row['description'] if pd.notna(row['description']) else None
-                }
-                for _, row in self.df.iterrows()
-            ]
+            # Precomputed once per table; copy the list so callers can't reorder it
+            return list(catalog[0].dish_list())
         except Exception as e:
             logger.error(f"❌ Failed to get all dishes: {e}")
             return []
@@ -234,10 +271,16 @@ class NutritionService:
             return 250  # Default estimate
     
     def reload_data(self):
-        """Reload nutrition data from CSV"""
+        """
+        Reload nutrition data from CSV
+        
+        The new table and matcher are built before being swapped in, so
+        concurrent lookups see either the old catalog or the new one.
+        """
         logger.info("🔄 Reloading nutrition data...")
         self._load_nutrition_data()
 
 
-# Global nutrition service instance
-nutrition_service = NutritionService()
\ No newline at end of file
+# Global nutrition service instance (the app installs the database catalog at
+# startup; scripts that skip that fall back to the CSV on first lookup)
+nutrition_service = NutritionService(autoload=False)
\ No newline at end of file
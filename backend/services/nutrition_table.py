@@ -0,0 +1,200 @@
+"""
+Compact columnar nutrition catalog
+"""
+
+import sys
+import json
+import math
+import bisect
+import logging
+from typing import Optional, Dict, Any, List, Sequence, Iterator, Tuple
+import numpy as np
+
+from .dish_matcher import normalize_dish_name
+
+logger = logging.getLogger(__name__)
+
+
+class DishRecord:
+    """Read-only view of one catalog row"""
+
+    __slots__ = ('id', 'dish_name', 'calories', 'meal_type', 'protein_g', 'carbs_g', 'fat_g', 'description')
+
+    def __init__(self, dish_id: int, dish_name: str, calories: int, meal_type: Optional[str],
+                 protein_g: Optional[float], carbs_g: Optional[float], fat_g: Optional[float],
+                 description: Optional[str]):
+        self.id = dish_id
+        self.dish_name = dish_name
+        self.calories = calories
+        self.meal_type = meal_type
+        self.protein_g = protein_g
+        self.carbs_g = carbs_g
+        self.fat_g = fat_g
+        self.description = description
+
+    def __repr__(self) -> str:
+        return f"DishRecord({self.id}, {self.dish_name!r}, {self.calories} cal)"
+
+
+def _intern(value: Any) -> Optional[str]:
+    """Intern a catalog string so repeated values share one object; NaN/None -> None"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return sys.intern(str(value))
+
+
+def _optional_float(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+class NutritionTable:
+    """
+    Struct-of-arrays nutrition catalog.
+
+    Calories and macros live in NumPy arrays (NaN marks a missing macro),
+    names and meal types are interned strings, and descriptions a plain list,
+    all indexed by a dense dish id. Name lookups go through a dict of
+    normalized names, and the serialized views served by /api/dishes are
+    built once per table. pandas is only needed to build a table from a CSV.
+    """
+
+    def __init__(self, names: Sequence[str], calories: Sequence[int], meal_types: Sequence[Optional[str]],
+                 protein_g: Sequence[Optional[float]], carbs_g: Sequence[Optional[float]],
+                 fat_g: Sequence[Optional[float]], descriptions: Sequence[Optional[str]],
+                 ids: Optional[Sequence[int]] = None):
+        self.ids: Optional[List[int]] = list(ids) if ids is not None else None
+        self.names: List[str] = [_intern(name) for name in names]
+        self.calories = np.asarray(calories, dtype=np.int32)
+        self.meal_types: List[Optional[str]] = [_intern(meal_type) for meal_type in meal_types]
+        self.macros = {
+            'protein_g': np.asarray([np.nan if v is None else v for v in protein_g], dtype=np.float64),
+            'carbs_g': np.asarray([np.nan if v is None else v for v in carbs_g], dtype=np.float64),
+            'fat_g': np.asarray([np.nan if v is None else v for v in fat_g], dtype=np.float64),
+        }
+        self.descriptions: List[Optional[str]] = [
+            None if description is None or (isinstance(description, float) and math.isnan(description))
+            else str(description)
+            for description in descriptions
+        ]
+
+        # Later duplicates win, matching a CSV re-import
+        self._ids: Dict[str, int] = {}
+        for dish_id, name in enumerate(self.names):
+            self._ids[normalize_dish_name(name)] = dish_id
+
+        self._dish_list: Optional[List[Dict[str, Any]]] = None
+        self._dish_list_json: Optional[bytes] = None
+
+    @classmethod
+    def from_dataframe(cls, df) -> "NutritionTable":
+        """Build a table from a DataFrame with the nutrition_lookup.csv columns"""
+        import pandas as pd
+
+        df = df.dropna(subset=['dish_name', 'calories'])
+        return cls(
+            names=df['dish_name'].tolist(),
+            calories=df['calories'].astype(int).to_numpy(),
+            meal_types=df['meal_type'].tolist(),
+            protein_g=pd.to_numeric(df['protein_g'], errors='coerce').tolist(),
+            carbs_g=pd.to_numeric(df['carbs_g'], errors='coerce').tolist(),
+            fat_g=pd.to_numeric(df['fat_g'], errors='coerce').tolist(),
+            descriptions=df['description'].tolist()
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path) -> "NutritionTable":
+        """Load a table from nutrition_lookup.csv"""
+        import pandas as pd
+
+        return cls.from_dataframe(pd.read_csv(csv_path))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __iter__(self) -> Iterator[DishRecord]:
+        return (self.record(dish_id) for dish_id in range(len(self.names)))
+
+    def id_of(self, dish_name: str) -> Optional[int]:
+        """Dish id for an exact (normalized) name, or None"""
+        return self._ids.get(normalize_dish_name(dish_name))
+
+    def record(self, dish_id: int) -> DishRecord:
+        """Row view for a dish id"""
+        return DishRecord(
+            dish_id,
+            self.names[dish_id],
+            int(self.calories[dish_id]),
+            self.meal_types[dish_id],
+            _optional_float(self.macros['protein_g'][dish_id]),
+            _optional_float(self.macros['carbs_g'][dish_id]),
+            _optional_float(self.macros['fat_g'][dish_id]),
+            self.descriptions[dish_id]
+        )
+
+    def get(self, dish_name: str) -> Optional[DishRecord]:
+        """Row view for an exact (normalized) name, or None"""
+        dish_id = self.id_of(dish_name)
+        return None if dish_id is None else self.record(dish_id)
+
+    def dish_list(self) -> List[Dict[str, Any]]:
+        """
+        All dishes as name/calories/meal_type/description dicts, plus the
+        database id when the table has ids (built once; do not mutate)
+        """
+        if self._dish_list is None:
+            self._dish_list = [
+                {
+                    'name': name,
+                    'calories': calories,
+                    'meal_type': meal_type,
+                    'description': description
+                }
+                for name, calories, meal_type, description in zip(
+                    self.names, self.calories.tolist(), self.meal_types, self.descriptions
+                )
+            ]
+            if self.ids is not None:
+                self._dish_list = [
+                    {'id': dish_id, **dish} for dish_id, dish in zip(self.ids, self._dish_list)
+                ]
+        return self._dish_list
+
+    def dish_list_json(self) -> bytes:
+        """dish_list() serialized once as UTF-8 JSON"""
+        if self._dish_list_json is None:
+            self._dish_list_json = json.dumps(self.dish_list(), ensure_ascii=False).encode('utf-8')
+        return self._dish_list_json
+
+    def page(self, after: Optional[int] = None, meal_type: Optional[str] = None,
+             limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Keyset page of dish_list()
+
+        Dishes are keyed by database id when the table has ids (rows are in
+        ascending id order), otherwise by position.
+
+        Args:
+            after: Key of the last dish of the previous page
+            meal_type: Only dishes of this meal type
+            limit: Maximum number of dishes (None for all)
+
+        Returns:
+            (dishes, next_after); next_after is None on the last page
+        """
+        keys = self.ids if self.ids is not None else range(len(self.names))
+        dishes = self.dish_list()
+        start = 0 if after is None else bisect.bisect_right(keys, after)
+
+        selected, last_key = [], after
+        for position in range(start, len(dishes)):
+            if meal_type and self.meal_types[position] != meal_type:
+                continue
+            if limit is not None and len(selected) == limit:
+                return selected, last_key
+            selected.append(dishes[position])
+            last_key = keys[position]
+        return selected, None
+
+    def nbytes(self) -> int:
+        """Approximate size of the numeric columns"""
+        return int(self.calories.nbytes + sum(column.nbytes for column in self.macros.values()))
@@ -9,12 +9,16 @@ Compatible with the sample integrator usage:
 """
 
 import os
+import json
 import logging
-from typing import Optional
+from typing import Optional, Union, Dict, List, Tuple
 import asyncio
+import httpx
 from dotenv import load_dotenv
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+from error_handlers import ExternalAPIError
 
 load_dotenv()
 
@@ -30,41 +34,94 @@ class OpenAIService:
         model: str = "openai/gpt-oss-120b",
         base_url: Optional[str] = None,
         stream: bool = False,
+        async_client: bool = True,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 60.0,
+        caption_batch_size: int = 10,
+        json_response_format: bool = True,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
     ):
         """
         :param api_key: API key (falls back to OPENAI_API_KEY env var).
         :param model: Model id (default: openai/gpt-oss-120b).
         :param base_url: Optional base_url for the OSS integrator (e.g. https://integrate.api.nvidia.com/v1).
         :param stream: If True, use streaming iterator mode (SDK yields chunks).
+        :param async_client: If True, use the native AsyncOpenAI client over one pooled
+            httpx connection pool (no thread hop per request). If False, run the blocking
+            client in a worker thread.
+        :param max_connections: Upper bound on concurrent connections to base_url (async mode).
+        :param max_keepalive_connections: Idle connections kept open for reuse (async mode).
+        :param keepalive_expiry: Seconds an idle pooled connection is kept alive (async mode).
+        :param timeout: Request timeout in seconds.
+        :param caption_batch_size: Dishes per completion in generate_captions_batch.
+        :param json_response_format: Send response_format={"type": "json_object"} with
+            JSON prompts; turn off for models that reject it.
+        :param transport: httpx transport for the async client (tests and stub servers).
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model
         self.base_url = base_url
         self.stream = stream
-        self.client: Optional[OpenAI] = None
-
-
-#  DEBUG
-        import os, logging
-        logger = logging.getLogger(__name__)
-        logger.info("openai_service sees OPENAI_API_KEY set? %s", bool(os.getenv("OPENAI_API_KEY")))
-        logger.info("openai_service sees OPENAI_BASE_URL: %s", os.getenv("OPENAI_BASE_URL"))
-
-
-
-        if self.api_key:
+        self.async_mode = async_client
+        self.timeout = timeout
+        self.caption_batch_size = caption_batch_size
+        self.json_response_format = json_response_format
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.transport = transport
+        self.client: Optional[Union[OpenAI, AsyncOpenAI]] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+
+        if not self.api_key:
+            logger.warning("⚠️ OpenAI API key not provided")
+        elif self.async_mode:
+            # The pooled async client belongs to an event loop: start() opens it
+            logger.info("✅ OpenAI service initialized (async, pooled)")
+        else:
             try:
-                if self.base_url:
-                    self.client = OpenAI(base_url=self.base_url, api_key=self.api_key)
-                else:
-                    self.client = OpenAI(api_key=self.api_key)
-                logger.info("✅ OpenAI client initialized successfully")
+                self.client = OpenAI(**self._client_kwargs())
+                logger.info("✅ OpenAI client initialized successfully (sync, threaded)")
             except Exception as e:
                 logger.error(f"❌ Failed to initialize OpenAI client: {e}")
-        else:
-            logger.warning("⚠️ OpenAI API key not provided")
 
-    def _get_bhai_style_prompt(self) -> str:
+    def _client_kwargs(self) -> Dict:
+        client_kwargs = {"api_key": self.api_key, "timeout": self.timeout}
+        if self.base_url:
+            client_kwargs["base_url"] = self.base_url
+        return client_kwargs
+
+    @property
+    def available(self) -> bool:
+        """Whether a client is open, or the async client can be opened on first use"""
+        return self.client is not None or (self.async_mode and bool(self.api_key))
+
+    async def start(self):
+        """Open the pooled async client (called on app startup)"""
+        if self.client is not None or not self.async_mode or not self.api_key:
+            return
+        try:
+            # One shared pool: keep-alive connections to base_url are reused across requests
+            self._http_client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, transport=self.transport)
+            self.client = AsyncOpenAI(http_client=self._http_client, **self._client_kwargs())
+            logger.info("✅ OpenAI async client opened")
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize OpenAI client: {e}")
+
+    async def aclose(self):
+        """Close the pooled HTTP connections (async mode; called on app shutdown)"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            self.client = None
+            logger.info("🔌 OpenAI connection pool closed")
+
+    @staticmethod
+    def _get_bhai_style_prompt() -> str:
         """Get the explicit bhai style definition for prompts"""
         return """
 You are a friendly Indian college student talking casually to a friend. Use this "bhai style" personality:
@@ -86,9 +143,16 @@ Always respond in this bhai style for the following request:
 """
 
     # ----- Public methods (same signatures as before) -----
-    async def generate_bhai_caption(self, dish: str, calories: int) -> str:
-        """Generate bhai-style caption for a dish"""
-        if not self.client:
+    async def generate_bhai_caption(self, dish: str, calories: int, fallback: bool = True) -> str:
+        """
+        Generate bhai-style caption for a dish
+
+        :param fallback: Return a template caption on failure; if False raise
+            ExternalAPIError instead (callers that cache the result).
+        """
+        if not self.available:
+            if not fallback:
+                raise ExternalAPIError("openai", "client not configured")
             return self._get_fallback_bhai_caption(dish, calories)
 
         try:
@@ -104,15 +168,28 @@ Make it sound natural and friendly, mentioning the dish and calories in bhai sty
                 caption = response.strip().strip('"').strip("'")
                 logger.info(f"✅ Generated bhai caption for {dish}")
                 return caption
+            elif not fallback:
+                raise ExternalAPIError("openai", f"No bhai caption generated for {dish}")
             else:
                 return self._get_fallback_bhai_caption(dish, calories)
+        except ExternalAPIError:
+            raise
         except Exception as e:
             logger.error(f"❌ OpenAI bhai caption generation failed: {e}")
+            if not fallback:
+                raise ExternalAPIError("openai", str(e))
             return self._get_fallback_bhai_caption(dish, calories)
 
-    async def generate_formal_caption(self, dish: str, calories: int) -> str:
-        """Generate formal caption for a dish"""
-        if not self.client:
+    async def generate_formal_caption(self, dish: str, calories: int, fallback: bool = True) -> str:
+        """
+        Generate formal caption for a dish
+
+        :param fallback: Return a template caption on failure; if False raise
+            ExternalAPIError instead (callers that cache the result).
+        """
+        if not self.available:
+            if not fallback:
+                raise ExternalAPIError("openai", "client not configured")
             return self._get_fallback_formal_caption(dish, calories)
 
         try:
@@ -127,15 +204,131 @@ Write 1-2 sentences in formal English that describes the dish nutritionally and
                 caption = response.strip().strip('"').strip("'")
                 logger.info(f"✅ Generated formal caption for {dish}")
                 return caption
+            elif not fallback:
+                raise ExternalAPIError("openai", f"No formal caption generated for {dish}")
             else:
                 return self._get_fallback_formal_caption(dish, calories)
+        except ExternalAPIError:
+            raise
         except Exception as e:
             logger.error(f"❌ OpenAI formal caption generation failed: {e}")
+            if not fallback:
+                raise ExternalAPIError("openai", str(e))
             return self._get_fallback_formal_caption(dish, calories)
 
+    async def generate_captions_batch(self, dishes: List[Tuple[str, int]]) -> List[Dict[str, str]]:
+        """
+        Generate bhai and formal captions for many dishes in few requests
+
+        Dishes are sent caption_batch_size at a time in one JSON-mode prompt,
+        so the bhai style preamble is paid once per chunk instead of once per
+        dish. Chunks run concurrently. Dishes missing from (or malformed in) a
+        response fall back to the single-dish calls; if those fail too the
+        templates are used and the item is marked "fallback": True.
+
+        :param dishes: (dish, calories) pairs.
+        :return: {"bhai", "formal"} captions, in the order of dishes.
+        """
+        if not dishes:
+            return []
+        if not self.available:
+            return [
+                {"bhai": self._get_fallback_bhai_caption(dish, calories),
+                 "formal": self._get_fallback_formal_caption(dish, calories),
+                 "fallback": True}
+                for dish, calories in dishes
+            ]
+
+        chunks = [dishes[i:i + self.caption_batch_size] for i in range(0, len(dishes), self.caption_batch_size)]
+        results = await asyncio.gather(*(self._generate_caption_chunk(chunk) for chunk in chunks))
+        return [captions for chunk_result in results for captions in chunk_result]
+
+    async def _generate_caption_chunk(self, dishes: List[Tuple[str, int]]) -> List[Dict[str, str]]:
+        """One batched completion, with per-dish fallback for anything it did not return"""
+        listing = json.dumps(
+            [{"id": i, "dish": dish, "calories": calories} for i, (dish, calories) in enumerate(dishes)],
+            ensure_ascii=False
+        )
+        prompt = f"""{self._get_bhai_style_prompt()}
+
+Write two captions for each dish below:
+- "bhai": a bhai-style caption mentioning the dish and its calories
+- "formal": 1-2 sentences in formal English (not bhai style) that describe the dish nutritionally and contextually
+
+Dishes:
+{listing}
+
+Respond with JSON only, no other text, in exactly this shape:
+{{"captions": [{{"id": 0, "bhai": "...", "formal": "..."}}]}}"""
+
+        parsed: Dict[int, Dict[str, str]] = {}
+        try:
+            response = await self._make_openai_request(
+                prompt, max_tokens=60 + 180 * len(dishes), temperature=0.5, json_mode=True
+            )
+            parsed = self._parse_batch_captions(response, len(dishes)) if response else {}
+        except Exception as e:
+            logger.error(f"❌ OpenAI batched caption generation failed: {e}")
+
+        async def caption(i: int, dish: str, calories: int) -> Dict[str, str]:
+            captions = parsed.get(i, {})
+            bhai, formal = captions.get("bhai"), captions.get("formal")
+            if bhai is not None and formal is not None:
+                return {"bhai": bhai, "formal": formal}
+
+            logger.warning(f"⚠️ Batched captions missing for {dish}, generating individually")
+            try:
+                bhai = bhai or await self.generate_bhai_caption(dish, calories, fallback=False)
+                formal = formal or await self.generate_formal_caption(dish, calories, fallback=False)
+                return {"bhai": bhai, "formal": formal}
+            except ExternalAPIError as e:
+                logger.error(f"❌ Captions for {dish} fell back to templates: {e}")
+                return {
+                    "bhai": bhai or self._get_fallback_bhai_caption(dish, calories),
+                    "formal": formal or self._get_fallback_formal_caption(dish, calories),
+                    "fallback": True
+                }
+
+        results = await asyncio.gather(*(caption(i, dish, calories) for i, (dish, calories) in enumerate(dishes)))
+        logger.info(f"✅ Generated captions for {len(dishes)} dishes ({len(parsed)} from one batched request)")
+        return list(results)
+
+    @staticmethod
+    def _parse_batch_captions(response: str, count: int) -> Dict[int, Dict[str, str]]:
+        """
+        Parse a batched caption response into {id: {"bhai", "formal"}}
+
+        Tolerates code fences and text around the JSON; entries with a bad id
+        or missing/empty captions are dropped (their dishes fall back).
+        """
+        start, end = response.find("{"), response.rfind("}")
+        if start == -1 or end < start:
+            logger.warning("⚠️ Batched caption response had no JSON object")
+            return {}
+        try:
+            entries = json.loads(response[start:end + 1]).get("captions", [])
+        except (ValueError, AttributeError):
+            logger.warning("⚠️ Batched caption response was not valid JSON")
+            return {}
+
+        parsed: Dict[int, Dict[str, str]] = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict) or not isinstance(entry.get("id"), int):
+                continue
+            if not 0 <= entry["id"] < count:
+                continue
+            captions = {
+                style: entry[style].strip().strip('"').strip("'")
+                for style in ("bhai", "formal")
+                if isinstance(entry.get(style), str) and entry[style].strip()
+            }
+            if captions:
+                parsed[entry["id"]] = captions
+        return parsed
+
     async def generate_comparison_suggestion(self, dish_a: str, dish_b: str, calories_a: int, calories_b: int) -> str:
         """Generate bhai-style comparison suggestion"""
-        if not self.client:
+        if not self.available:
             return self._get_fallback_comparison(dish_a, dish_b, calories_a, calories_b)
 
         try:
@@ -159,7 +352,7 @@ Give ONE line suggestion in bhai style about which is better and why."""
 
     async def generate_weekly_summary(self, total_calories: int, date_range: str, avg_per_day: int) -> str:
         """Generate formal weekly summary"""
-        if not self.client:
+        if not self.available:
             return self._get_fallback_weekly_summary(total_calories, avg_per_day)
 
         try:
@@ -188,88 +381,116 @@ Write a formal, informative summary about the eating patterns and nutritional ba
         max_tokens: int = 150,
         temperature: float = 0.7,
         top_p: float = 1.0,
+        json_mode: bool = False,
     ) -> Optional[str]:
         """
         Make request to OpenAI / GPT-OSS API.
-    
-        - Uses asyncio.to_thread to call blocking SDK in a thread-safe way.
-        - For streaming: runs the streaming iterator inside a thread, collects only assistant
-          content (ignores reasoning_content), and returns the assembled string.
-        - For non-streaming: calls the API in a thread and extracts assistant content.
+
+        - Async mode: awaits the native AsyncOpenAI client directly on the event loop,
+          sharing one pooled connection to base_url across all requests.
+        - Sync mode: uses asyncio.to_thread to call the blocking SDK in a worker thread.
+        - For streaming: collects only assistant content (ignores reasoning_content)
+          and returns the assembled string.
+        - For non-streaming: extracts assistant content.
+        - json_mode asks for a JSON object response where the model supports it
+          (json_response_format); the prompt must still ask for JSON.
         """
-        if not self.client:
+        if self.client is None:
+            # Opened lazily if startup did not
+            await self.start()
+        if self.client is None:
             return None
-    
+
+        request_kwargs = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+        }
+        if json_mode and self.json_response_format:
+            request_kwargs["response_format"] = {"type": "json_object"}
+
         try:
-            if self.stream:
-                # Run the streaming call inside a worker thread and collect assistant-only deltas.
-                def _sync_stream_collect():
-                    collected_parts = []
-                    try:
-                        gen = self.client.chat.completions.create(
-                            model=self.model,
-                            messages=[{"role": "user", "content": prompt}],
-                            max_tokens=max_tokens,
-                            temperature=temperature,
-                            top_p=top_p,
-                            stream=True,
-                        )
-                        for chunk in gen:
-                            # ignore reasoning_content; only capture assistant content
-                            delta = chunk.choices[0].delta
-                            content = getattr(delta, "content", None)
-                            if content:
-                                collected_parts.append(content)
-                    except Exception:
-                        # re-raise so outer thread captures/logs
-                        raise
-                    return "".join(collected_parts).strip() or None
-    
-                try:
-                    result_text = await asyncio.to_thread(_sync_stream_collect)
-                    return result_text
-                except Exception:
-                    logger.exception("❌ OpenAI streaming request failed:")
-                    return None
-    
-            else:
-                # Non-streaming path: make the request in a thread and extract assistant message
-                def _sync_nonstream_call():
-                    return self.client.chat.completions.create(
-                        model=self.model,
-                        messages=[{"role": "user", "content": prompt}],
-                        max_tokens=max_tokens,
-                        temperature=temperature,
-                        top_p=top_p,
-                        stream=False,
-                    )
-    
-                try:
-                    resp = await asyncio.to_thread(_sync_nonstream_call)
-    
-                    # Prefer the standard assistant content location
-                    msg = getattr(resp.choices[0], "message", None)
-                    content = getattr(msg, "content", None) if msg is not None else None
-                    if content:
-                        return content.strip()
-    
-                    # Fallback: some SDKs put text directly on the choice
-                    text = getattr(resp.choices[0], "text", None)
-                    if text:
-                        return text.strip()
-    
-                    logger.warning("OpenAI non-stream response had no usable content; response repr logged.")
-                    logger.debug("Full non-stream response: %s", repr(resp))
-                    return None
-                except Exception:
-                    logger.exception("❌ OpenAI API request failed:")
-                    return None
-    
+            if self.async_mode:
+                return await self._make_async_request(request_kwargs)
+            return await self._make_threaded_request(request_kwargs)
         except Exception:
             # catch-all for unexpected failures
             logger.exception("❌ Unexpected error in _make_openai_request:")
             return None
 
+    def _extract_content(self, resp) -> Optional[str]:
+        """Pull assistant text out of a non-streaming response"""
+        # Prefer the standard assistant content location
+        msg = getattr(resp.choices[0], "message", None)
+        content = getattr(msg, "content", None) if msg is not None else None
+        if content:
+            return content.strip()
+
+        # Fallback: some SDKs put text directly on the choice
+        text = getattr(resp.choices[0], "text", None)
+        if text:
+            return text.strip()
+
+        logger.warning("OpenAI non-stream response had no usable content; response repr logged.")
+        logger.debug("Full non-stream response: %s", repr(resp))
+        return None
+
+    async def _make_async_request(self, request_kwargs: Dict) -> Optional[str]:
+        """Native async request: no worker thread is held during the round trip"""
+        try:
+            if self.stream:
+                collected_parts = []
+                gen = await self.client.chat.completions.create(**request_kwargs, stream=True)
+                async for chunk in gen:
+                    if not chunk.choices:
+                        continue
+                    # ignore reasoning_content; only capture assistant content
+                    content = getattr(chunk.choices[0].delta, "content", None)
+                    if content:
+                        collected_parts.append(content)
+                return "".join(collected_parts).strip() or None
+
+            resp = await self.client.chat.completions.create(**request_kwargs, stream=False)
+            return self._extract_content(resp)
+        except Exception:
+            logger.exception("❌ OpenAI async request failed:")
+            return None
+
+    async def _make_threaded_request(self, request_kwargs: Dict) -> Optional[str]:
+        """Blocking SDK request executed in a worker thread"""
+        if self.stream:
+            # Run the streaming call inside a worker thread and collect assistant-only deltas.
+            def _sync_stream_collect():
+                collected_parts = []
+                gen = self.client.chat.completions.create(**request_kwargs, stream=True)
+                for chunk in gen:
+                    if not chunk.choices:
+                        continue
+                    # ignore reasoning_content; only capture assistant content
+                    content = getattr(chunk.choices[0].delta, "content", None)
+                    if content:
+                        collected_parts.append(content)
+                return "".join(collected_parts).strip() or None
+
+            try:
+                return await asyncio.to_thread(_sync_stream_collect)
+            except Exception:
+                logger.exception("❌ OpenAI streaming request failed:")
+                return None
+
+        # Non-streaming path: make the request in a thread and extract assistant message
+        def _sync_nonstream_call():
+            return self.client.chat.completions.create(**request_kwargs, stream=False)
+
+        try:
+            resp = await asyncio.to_thread(_sync_nonstream_call)
+            return self._extract_content(resp)
+        except Exception:
+            logger.exception("❌ OpenAI API request failed:")
+            return None
+
 
     # ----- Fallback methods (unchanged) -----
     def _get_fallback_bhai_caption(self, dish: str, calories: int) -> str:
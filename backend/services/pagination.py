@@ -0,0 +1,34 @@
+"""
+Opaque keyset cursors and NDJSON encoding shared by the list endpoints
+"""
+
+import json
+import base64
+from typing import Any, Dict, Iterable, List
+
+
+def encode_cursor(*values) -> str:
+    """Opaque URL-safe cursor for the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Inverse of encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(values, list):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return values
+
+
+def ndjson(items: Iterable[Dict[str, Any]]) -> bytes:
+    """Items as newline-delimited UTF-8 JSON"""
+    return b"".join(json.dumps(item, ensure_ascii=False).encode('utf-8') + b"\n" for item in items)
@@ -0,0 +1,450 @@
+"""
+Preview generation pipeline: image and captions fan out concurrently
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Awaitable, Callable, AsyncIterator
+from datetime import datetime
+
+from database import AsyncSessionLocal
+from error_handlers import ExternalAPIError
+from .service_manager import service_manager
+from .nutrition_service import nutrition_service
+from .cache_service import cache_service
+from .image_store import image_store
+from .single_flight import SingleFlight
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IMAGE_URL = "/data/images/default_placeholder.png"
+
+
+class PreviewPipeline:
+    """
+    Builds daily previews.
+
+    Cache lookups run first, then the image, bhai caption and formal caption
+    are generated at the same time, each under its own timeout and with its
+    own fallback. Providers are called with fallback=False so a failure
+    reaches the stage, which records it in meta.fallbacks; nothing produced
+    by a fallback is cached. Concurrent misses for the same dish share one generation
+    through a single-flight keyed by (normalized dish name, artifact type).
+    Batches resolve their cache lookups and matches up front and generate the
+    missing dishes under a per-batch concurrency limit.
+
+    The pipeline opens its own short-lived sessions: a shared generation can
+    outlive the request that started it, and an AsyncSession must never be
+    used by two coroutines at once.
+    """
+
+    def __init__(self, image_timeout: float = 35.0, caption_timeout: float = 20.0,
+                 batch_concurrency: int = 4, batch_caption_seconds_per_dish: float = 2.0):
+        self.image_timeout = image_timeout
+        self.caption_timeout = caption_timeout
+        self.batch_concurrency = batch_concurrency
+        self.batch_caption_seconds_per_dish = batch_caption_seconds_per_dish
+        self.flight = SingleFlight("preview-generation")
+
+    @staticmethod
+    def normalize(dish: str) -> str:
+        """Normalize a dish name the same way CacheService does"""
+        return dish.lower().strip()
+
+    async def _run_stage(self, stage: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float],
+                         fallback: Callable[[], Any], timings: Dict[str, float],
+                         fallbacks: list) -> Any:
+        """Run one stage with a timeout, recording its duration and any fallback"""
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(fn(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Preview stage '{stage}' timed out after {timeout}s, using fallback")
+            fallbacks.append(stage)
+            return fallback()
+        except Exception as e:
+            logger.error(f"❌ Preview stage '{stage}' failed: {e}")
+            fallbacks.append(stage)
+            return fallback()
+        finally:
+            timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _batch_caption_timeout(self, count: int) -> float:
+        """Timeout for a batched caption request: chunks run concurrently, so scale by one chunk"""
+        chunk_size = getattr(service_manager.openai_service, 'caption_batch_size', None) or count
+        return self.caption_timeout + self.batch_caption_seconds_per_dish * min(count, chunk_size)
+
+    async def _generate_image(self, dish: str, normalized_name: str) -> Dict[str, Any]:
+        """Generate a dish image (shared by concurrent callers)"""
+        timings: Dict[str, float] = {}
+        fallbacks: list = []
+
+        image_url = await self._run_stage(
+            'image',
+            lambda: service_manager.generate_dish_image(dish, fallback=False),
+            self.image_timeout,
+            lambda: DEFAULT_IMAGE_URL,
+            timings, fallbacks
+        )
+        # Variant URLs are resolved once here and cached with the image
+        return {
+            'image_url': image_url,
+            'image_variants': image_store.variant_urls(image_url),
+            'timings': timings,
+            'fallbacks': fallbacks
+        }
+
+    async def _generate_captions(self, dish: str, calories: int,
+                                 caption_source: Optional[Callable[[], Awaitable[Dict[str, str]]]] = None
+                                 ) -> Dict[str, Any]:
+        """Generate bhai and formal captions concurrently (shared by concurrent callers)"""
+        timings: Dict[str, float] = {}
+        fallbacks: list = []
+
+        if caption_source is not None:
+            # Both captions come from one (batched) completion, which enforces its own timeout
+            captions = await self._run_stage(
+                'captions',
+                caption_source,
+                None,
+                lambda: {
+                    "bhai": service_manager._fallback_bhai_caption(dish, calories),
+                    "formal": service_manager._fallback_formal_caption(dish, calories)
+                },
+                timings, fallbacks
+            )
+            return {'captions': captions, 'timings': timings, 'fallbacks': fallbacks}
+
+        bhai_caption, formal_caption = await asyncio.gather(
+            self._run_stage(
+                'bhai_caption',
+                lambda: service_manager.generate_bhai_caption(dish, calories, fallback=False),
+                self.caption_timeout,
+                lambda: service_manager._fallback_bhai_caption(dish, calories),
+                timings, fallbacks
+            ),
+            self._run_stage(
+                'formal_caption',
+                lambda: service_manager.generate_formal_caption(dish, calories, fallback=False),
+                self.caption_timeout,
+                lambda: service_manager._fallback_formal_caption(dish, calories),
+                timings, fallbacks
+            )
+        )
+
+        return {
+            'captions': {"bhai": bhai_caption, "formal": formal_caption},
+            'timings': timings,
+            'fallbacks': fallbacks
+        }
+
+    async def _get_or_generate_image(self, dish: str, normalized_name: str,
+                                     cached_image: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the cached image or generate a new one, once per dish"""
+        if cached_image:
+            logger.info(f"✅ Using cached image for '{dish}'")
+            image_url = cached_image['image_url']
+            return {
+                'image_url': image_url,
+                # Entries cached before variants were stored resolve them here, off the hit path
+                'image_variants': cached_image.get('variants') or image_store.variant_urls(image_url),
+                'timings': {'image': 0.0},
+                'fallbacks': [],
+                'cached': True
+            }
+
+        result = await self.flight.do(
+            (normalized_name, 'image'),
+            lambda: self._generate_image(dish, normalized_name)
+        )
+        return {**result, 'cached': False}
+
+    async def _get_or_generate_captions(self, dish: str, normalized_name: str, calories: int,
+                                        cached_captions: Optional[Dict[str, str]],
+                                        caption_source: Optional[Callable[[], Awaitable[Dict[str, str]]]] = None
+                                        ) -> Dict[str, Any]:
+        """Return cached captions or generate new ones, once per dish"""
+        if cached_captions:
+            logger.info(f"✅ Using cached captions for '{dish}'")
+            return {
+                'captions': cached_captions,
+                'timings': {'bhai_caption': 0.0, 'formal_caption': 0.0},
+                'fallbacks': [],
+                'cached': True
+            }
+
+        result = await self.flight.do(
+            (normalized_name, 'captions'),
+            lambda: self._generate_captions(dish, calories, caption_source)
+        )
+        return {**result, 'cached': False}
+
+    async def _build_preview(self, dish: str, normalized_name: str,
+                             dish_info: Optional[Dict[str, Any]] = None,
+                             cached_artifacts: Optional[Dict[str, Any]] = None,
+                             caption_source: Optional[Callable[[], Awaitable[Dict[str, str]]]] = None
+                             ) -> Dict[str, Any]:
+        """Look up cached artifacts, generate the missing ones concurrently and cache the result"""
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        # Get nutrition information
+        if dish_info is None:
+            dish_info = nutrition_service.get_dish_info(dish)
+        calories = dish_info['calories']
+
+        if cached_artifacts is None:
+            # Artifact cache lookups; the connection is released while generating
+            async with AsyncSessionLocal() as db:
+                cached_image = await cache_service.get_cached_image_data(dish, db)
+                cached_captions = await cache_service.get_cached_captions(dish, db)
+        else:
+            cached_image = cached_artifacts.get('image')
+            cached_captions = cached_artifacts.get('captions')
+        timings['lookup'] = round((time.perf_counter() - started) * 1000, 1)
+
+        image_result, caption_result = await asyncio.gather(
+            self._get_or_generate_image(dish, normalized_name, cached_image),
+            self._get_or_generate_captions(dish, normalized_name, calories, cached_captions, caption_source)
+        )
+
+        timings.update(image_result['timings'])
+        timings.update(caption_result['timings'])
+        fallbacks = image_result['fallbacks'] + caption_result['fallbacks']
+
+        image_url = image_result['image_url']
+        image_variants = image_result['image_variants']
+        captions = caption_result['captions']
+
+        # Artifacts produced by a timeout/error fallback are not cached
+        image_to_cache = None
+        captions_to_cache = None
+        if not image_result['cached'] and not image_result['fallbacks']:
+            image_to_cache = image_url
+        if not caption_result['cached'] and not caption_result['fallbacks']:
+            captions_to_cache = captions
+
+        timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+
+        # Create response
+        preview_data = {
+            "dish": dish,
+            "calories": calories,
+            "image_url": image_url,
+            "image_variants": image_variants,
+            "captions": captions,
+            "meta": {
+                "model": "openai-gpt-4o-mini",
+                "generated_at": datetime.utcnow().isoformat(),
+                "matched_dish": dish_info.get('matched_name', dish),
+                "confidence": dish_info.get('confidence', 100),
+                "timings_ms": timings,
+                "fallbacks": fallbacks
+            }
+        }
+
+        # Cache the complete preview and any new artifacts in one transaction
+        async with AsyncSessionLocal() as db:
+            await cache_service.cache_artifacts(
+                dish, db,
+                preview_data=preview_data if not fallbacks else None,
+                image_url=image_to_cache,
+                image_variants=image_variants,
+                captions=captions_to_cache
+            )
+
+        slowest = max(
+            (stage for stage in timings if stage not in ('total', 'lookup')),
+            key=timings.get
+        )
+        logger.info(
+            f"✅ Generated complete preview for '{dish}' ({calories} cal) in "
+            f"{timings['total']}ms (slowest stage: {slowest})"
+        )
+        return preview_data
+
+    async def generate(self, dish: str, dish_info: Optional[Dict[str, Any]] = None,
+                       cached_artifacts: Optional[Dict[str, Any]] = None,
+                       caption_source: Optional[Callable[[], Awaitable[Dict[str, str]]]] = None
+                       ) -> Dict[str, Any]:
+        """
+        Generate (or join an in-flight generation of) the preview for a dish
+
+        Args:
+            dish: Name of the dish as requested
+            dish_info: Nutrition match already resolved by the caller (looked up if None)
+            cached_artifacts: Already looked-up {'image', 'captions'} cache entries (looked up if None)
+            caption_source: Coroutine factory returning both captions, e.g. from a
+                batched completion (separate bhai/formal requests if None); it is
+                not bounded by caption_timeout and must time out on its own
+
+        Returns:
+            Preview data dictionary
+        """
+        normalized_name = self.normalize(dish)
+        return await self.flight.do(
+            (normalized_name, 'preview'),
+            lambda: self._build_preview(dish, normalized_name, dish_info, cached_artifacts, caption_source)
+        )
+
+    async def refresh(self, dish: str, cache_type: str):
+        """
+        Regenerate and re-cache one stale cache entry
+
+        Registered as CacheService's stale-while-revalidate refresher; shares
+        the single-flight with request-driven generation. A preview is rebuilt
+        from fresh artifacts only (stale ones are regenerated, not reused).
+        Fallback output is not cached, so a failed refresh leaves the stale
+        entry in place.
+
+        Args:
+            dish: Name of the dish as requested
+            cache_type: 'preview', 'image' or 'captions'
+
+        Raises:
+            ExternalAPIError: If any part of the refresh fell back
+        """
+        normalized_name = self.normalize(dish)
+
+        if cache_type == 'preview':
+            async with AsyncSessionLocal() as db:
+                cached = await cache_service.get_cached_many(
+                    [dish], ('image', 'captions'), db, allow_stale=False
+                )
+            preview_data = await self.generate(dish, cached_artifacts={
+                'image': cached.get((normalized_name, 'image')),
+                'captions': cached.get((normalized_name, 'captions'))
+            })
+            fallbacks = preview_data['meta']['fallbacks']
+            if fallbacks:
+                raise ExternalAPIError("preview", f"refresh of '{dish}' fell back: {', '.join(fallbacks)}")
+            return
+
+        if cache_type == 'image':
+            result = await self.flight.do(
+                (normalized_name, 'image'),
+                lambda: self._generate_image(dish, normalized_name)
+            )
+            artifacts = {'image_url': result['image_url'], 'image_variants': result['image_variants']}
+        elif cache_type == 'captions':
+            calories = nutrition_service.get_dish_info(dish)['calories']
+            result = await self.flight.do(
+                (normalized_name, 'captions'),
+                lambda: self._generate_captions(dish, calories)
+            )
+            artifacts = {'captions': result['captions']}
+        else:
+            return
+
+        if result['fallbacks']:
+            raise ExternalAPIError("preview", f"refresh of '{dish}' fell back: {', '.join(result['fallbacks'])}")
+        async with AsyncSessionLocal() as db:
+            await cache_service.cache_artifacts(dish, db, **artifacts)
+
+    async def generate_batch(self, dishes: List[str], concurrency: Optional[int] = None,
+                             image_limiter: Optional[RateLimiter] = None,
+                             caption_limiter: Optional[RateLimiter] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Previews for many dishes, yielded as each one becomes ready
+
+        Repeated dishes are generated once. Cached previews, images and
+        captions for the whole batch come from one cache query and all misses
+        are matched against one catalog snapshot; missing captions are written
+        by batched completions while the images are generated, and at most
+        batch_concurrency generations run at a time. Closing the iterator
+        cancels the rest.
+
+        Args:
+            dishes: Names of the dishes as requested
+            concurrency: Generations at a time (batch_concurrency if None)
+            image_limiter: Paces image generations (e.g. for background warm-ups)
+            caption_limiter: Paces the batched caption request
+
+        Yields:
+            {'dish': normalized name, 'preview': data or None, 'cached': bool, 'error': str or None}
+        """
+        unique: Dict[str, str] = {}
+        for dish in dishes:
+            unique.setdefault(self.normalize(dish), dish)
+
+        async with AsyncSessionLocal() as db:
+            cached = await cache_service.get_cached_many(unique, ('preview', 'image', 'captions'), db)
+
+        pending: Dict[str, str] = {}
+        for normalized_name, dish in unique.items():
+            preview_data = cached.get((normalized_name, 'preview'))
+            if preview_data is not None:
+                yield {'dish': normalized_name, 'preview': preview_data, 'cached': True, 'error': None}
+            else:
+                pending[normalized_name] = dish
+
+        if not pending:
+            return
+
+        dish_infos = nutrition_service.get_dish_infos(list(pending.values()))
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+
+        # One batched caption request for every miss without cached captions
+        uncaptioned = [name for name in pending if cached.get((name, 'captions')) is None]
+        caption_batch = None
+        if uncaptioned:
+            async def caption_all() -> List[Dict[str, str]]:
+                if caption_limiter is not None:
+                    await caption_limiter.acquire()
+                # Timed from here, after any rate limit wait, and scaled by the dishes per completion
+                return await asyncio.wait_for(
+                    service_manager.generate_captions_batch(
+                        [(pending[name], dish_infos[pending[name]]['calories']) for name in uncaptioned]
+                    ),
+                    timeout=self._batch_caption_timeout(len(uncaptioned))
+                )
+            caption_batch = asyncio.ensure_future(caption_all())
+        caption_index = {name: i for i, name in enumerate(uncaptioned)}
+
+        async def batched_captions(normalized_name: str) -> Dict[str, str]:
+            captions = (await asyncio.shield(caption_batch))[caption_index[normalized_name]]
+            if captions.get('fallback'):
+                # Surface template captions as a stage failure so they are flagged, not cached
+                raise ExternalAPIError("openai", f"No batched captions for '{normalized_name}'")
+            return captions
+
+        async def run(normalized_name: str, dish: str) -> Dict[str, Any]:
+            cached_artifacts = {
+                'image': cached.get((normalized_name, 'image')),
+                'captions': cached.get((normalized_name, 'captions'))
+            }
+            caption_source = None
+            if normalized_name in caption_index:
+                caption_source = lambda: batched_captions(normalized_name)
+            async with semaphore:
+                try:
+                    if image_limiter is not None and not cached_artifacts['image']:
+                        await image_limiter.acquire()
+                    preview_data = await self.generate(dish, dish_infos[dish], cached_artifacts, caption_source)
+                    return {'dish': normalized_name, 'preview': preview_data, 'cached': False, 'error': None}
+                except Exception as e:
+                    logger.error(f"❌ Batch preview for '{dish}' failed: {e}")
+                    return {'dish': normalized_name, 'preview': None, 'cached': False, 'error': str(e)}
+
+        tasks = [asyncio.ensure_future(run(normalized_name, dish)) for normalized_name, dish in pending.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            if caption_batch is not None:
+                caption_batch.cancel()
+
+
+# Global preview pipeline instance
+preview_pipeline = PreviewPipeline(
+    image_timeout=float(os.getenv("PREVIEW_IMAGE_TIMEOUT_SECONDS") or 35),
+    caption_timeout=float(os.getenv("PREVIEW_CAPTION_TIMEOUT_SECONDS") or 20),
+    batch_concurrency=int(os.getenv("PREVIEW_BATCH_CONCURRENCY") or 4),
+    batch_caption_seconds_per_dish=float(os.getenv("PREVIEW_BATCH_CAPTION_SECONDS_PER_DISH") or 2)
+)
+cache_service.set_refresher(preview_pipeline.refresh)
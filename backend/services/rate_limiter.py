@@ -0,0 +1,58 @@
+"""
+Token-bucket rate limiting for calls to external providers
+"""
+
+import time
+import asyncio
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Async token bucket: at most ``per_minute`` acquisitions per minute on
+    average, with bursts of up to ``burst``.
+
+    Waiters are served in arrival order. A per_minute of 0 disables limiting.
+    """
+
+    def __init__(self, per_minute: float, burst: int = 1, name: str = "rate-limiter"):
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.acquired = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        """Wait until tokens are available and take them"""
+        if self.per_minute <= 0:
+            self.acquired += tokens
+            return
+
+        async with self._lock:
+            self._refill()
+            if self._tokens < tokens:
+                delay = (tokens - self._tokens) * 60.0 / self.per_minute
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= tokens
+            self.acquired += tokens
+
+    def stats(self) -> Dict[str, float]:
+        """Acquisition counters"""
+        return {
+            'per_minute': self.per_minute,
+            'acquired': self.acquired,
+            'waited_seconds': round(self.waited_seconds, 1)
+        }
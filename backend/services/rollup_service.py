@@ -0,0 +1,212 @@
+"""
+Daily rollup maintenance for meal statistics
+
+Every UserMeal insert/update applies a delta to the matching
+(day, meal_type) row of daily_rollups and (day, meal_type, dish_name) row of
+daily_dish_rollups in the same transaction, so range reads touch a few small
+rows per day regardless of how many meals were logged.
+
+Run as a module to backfill or rebuild the tables:
+    python -m services.rollup_service --rebuild [--start YYYY-MM-DD] [--end YYYY-MM-DD]
+"""
+
+import logging
+from typing import Optional, Dict, Any
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import DailyRollup, DailyDishRollup, UserMeal, UPSERT_DIALECTS
+
+logger = logging.getLogger(__name__)
+
+
+class RollupService:
+    """
+    Keeps daily_rollups and daily_dish_rollups in sync with user_meals
+
+    Deltas are applied by the database (INSERT ... ON CONFLICT DO UPDATE SET
+    n = n + excluded.n), never read into Python and written back, so
+    concurrent meal writes cannot overwrite each other's counts.
+    """
+
+    @staticmethod
+    def _increment_query(model, key: Dict[str, Any], deltas: Dict[str, int]):
+        """UPDATE adding deltas to the row of model identified by key"""
+        where = [getattr(model, column) == value for column, value in key.items()]
+        increments = {column: getattr(model, column) + delta for column, delta in deltas.items()}
+        return update(model).where(*where).values(**increments)
+
+    @staticmethod
+    def _prune_query(model, key: Dict[str, Any]):
+        """DELETE for the row of model identified by key once its last meal is gone"""
+        where = [getattr(model, column) == value for column, value in key.items()]
+        return delete(model).where(*where, model.meal_count <= 0)
+
+    @classmethod
+    async def _add(cls, db: AsyncSession, model, key: Dict[str, Any], deltas: Dict[str, int]):
+        """Add deltas to the row of model identified by key, creating it if needed"""
+        insert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+        if insert is not None:
+            statement = insert(model).values(**key, **deltas)
+            set_ = {
+                column: getattr(model, column) + getattr(statement.excluded, column)
+                for column in deltas
+            }
+            if hasattr(model, 'updated_at'):
+                # onupdate defaults do not run for ON CONFLICT updates
+                set_['updated_at'] = datetime.utcnow()
+            statement = statement.on_conflict_do_update(
+                index_elements=[getattr(model, column) for column in key],
+                set_=set_
+            )
+            await db.execute(statement)
+            return
+
+        # Other backends: increment in place, inserting the row if there is none yet
+        if (await db.execute(cls._increment_query(model, key, deltas))).rowcount:
+            return
+        try:
+            # Savepoint: a concurrent writer may create the same row first
+            async with db.begin_nested():
+                db.add(model(**key, **deltas))
+        except IntegrityError:
+            await db.execute(cls._increment_query(model, key, deltas))
+
+    async def apply_meal(self, db: AsyncSession, consumed_at: datetime, meal_type: str,
+                   dish_name: str, calories: int, sign: int = 1):
+        """
+        Add (sign=1) or remove (sign=-1) one meal from the rollups
+
+        Does not commit; call it before the commit that writes the UserMeal.
+        """
+        key = {'day': consumed_at.date(), 'meal_type': meal_type}
+        dish_key = {**key, 'dish_name': dish_name}
+
+        await self._add(
+            db, DailyRollup, key,
+            {'calories_sum': sign * (calories or 0), 'meal_count': sign}
+        )
+        await self._add(db, DailyDishRollup, dish_key, {'meal_count': sign})
+
+        if sign < 0:
+            # Drop rows whose last meal was removed
+            await db.execute(self._prune_query(DailyRollup, key))
+            await db.execute(self._prune_query(DailyDishRollup, dish_key))
+
+    async def record_meal(self, db: AsyncSession, meal: UserMeal):
+        """Add a new or updated meal to the rollups"""
+        await self.apply_meal(db, meal.consumed_at, meal.meal_type, meal.dish_name, meal.calories, sign=1)
+
+    async def unrecord_meal(self, db: AsyncSession, consumed_at: datetime, meal_type: str,
+                      dish_name: str, calories: int):
+        """Remove a meal's previous values from the rollups (before an update)"""
+        await self.apply_meal(db, consumed_at, meal_type, dish_name, calories, sign=-1)
+
+    async def rebuild(self, db: AsyncSession, start_date: Optional[date] = None,
+                end_date: Optional[date] = None) -> int:
+        """
+        Recompute rollups from user_meals (optionally only for a date range)
+
+        Args:
+            db: Database session
+            start_date: First day to rebuild (None for no lower bound)
+            end_date: Last day to rebuild, inclusive (None for no upper bound)
+
+        Returns:
+            Number of rollup rows written
+        """
+        day = func.date(UserMeal.consumed_at)
+
+        rollups = delete(DailyRollup)
+        dish_rollups = delete(DailyDishRollup)
+        meals = select(
+            day.label('day'),
+            UserMeal.meal_type,
+            UserMeal.dish_name,
+            func.count(UserMeal.id).label('meal_count'),
+            func.sum(UserMeal.calories).label('calories')
+        ).where(UserMeal.consumed_at.isnot(None))
+
+        if start_date:
+            rollups = rollups.where(DailyRollup.day >= start_date)
+            dish_rollups = dish_rollups.where(DailyDishRollup.day >= start_date)
+            meals = meals.where(UserMeal.consumed_at >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            rollups = rollups.where(DailyRollup.day <= end_date)
+            dish_rollups = dish_rollups.where(DailyDishRollup.day <= end_date)
+            meals = meals.where(UserMeal.consumed_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+
+        try:
+            await db.execute(rollups)
+            await db.execute(dish_rollups)
+
+            grouped: Dict[tuple, Dict[str, Any]] = {}
+            dish_rows = []
+            meals = meals.group_by(day, UserMeal.meal_type, UserMeal.dish_name)
+            for row in (await db.execute(meals)).all():
+                key = (date.fromisoformat(str(row.day)), row.meal_type)
+                entry = grouped.setdefault(key, {'calories_sum': 0, 'meal_count': 0})
+                entry['calories_sum'] += int(row.calories or 0)
+                entry['meal_count'] += row.meal_count
+                dish_rows.append(DailyDishRollup(
+                    day=key[0], meal_type=key[1], dish_name=row.dish_name, meal_count=row.meal_count
+                ))
+
+            db.add_all([
+                DailyRollup(
+                    day=key[0],
+                    meal_type=key[1],
+                    calories_sum=entry['calories_sum'],
+                    meal_count=entry['meal_count']
+                )
+                for key, entry in grouped.items()
+            ])
+            db.add_all(dish_rows)
+            await db.commit()
+
+            logger.info(f"✅ Rebuilt {len(grouped)} daily rollup rows")
+            return len(grouped)
+
+        except Exception as e:
+            logger.error(f"❌ Failed to rebuild daily rollups: {e}")
+            await db.rollback()
+            raise
+
+    async def backfill_if_empty(self, db: AsyncSession) -> int:
+        """Build the rollups once for databases created before the tables existed"""
+        if (await db.execute(select(DailyRollup.id).limit(1))).first() is not None:
+            return 0
+        if (await db.execute(select(UserMeal.id).limit(1))).first() is None:
+            return 0
+        logger.info("📊 daily_rollups is empty, backfilling from user_meals...")
+        return await self.rebuild(db)
+
+
+# Global rollup service instance
+rollup_service = RollupService()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from database import AsyncSessionLocal, async_engine, init_database
+
+    parser = argparse.ArgumentParser(description="Maintain the daily_rollups table")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute rollups from user_meals")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            if args.rebuild or args.start or args.end:
+                count = await rollup_service.rebuild(db, args.start, args.end)
+            else:
+                count = await rollup_service.backfill_if_empty(db)
+        await async_engine.dispose()
+        print(f"✅ {count} daily rollup rows written")
+
+    logging.basicConfig(level=logging.INFO)
+    init_database()
+    asyncio.run(main())
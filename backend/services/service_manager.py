@@ -10,11 +10,12 @@ Robust loading strategy:
 
 import os
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import json
 from pathlib import Path
 from .openai_service import OpenAIService
 from .stability_service import StabilityAIService
+from error_handlers import ExternalAPIError
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -99,12 +100,45 @@ class ServiceManager:
                 if stream_env is not None:
                     stream_flag = stream_env.lower() in ("1", "true", "yes")
 
+            # async client mode (native AsyncOpenAI over a pooled connection) is the default
+            async_flag = True
+            if "async_client" in openai_config:
+                async_flag = bool(openai_config.get("async_client"))
+            else:
+                async_env = os.getenv("OPENAI_ASYNC_CLIENT")
+                if async_env is not None:
+                    async_flag = async_env.lower() in ("1", "true", "yes")
+
+            # response_format={"type": "json_object"} for JSON prompts, unless the model rejects it
+            json_format_flag = True
+            if "json_response_format" in openai_config:
+                json_format_flag = bool(openai_config.get("json_response_format"))
+            else:
+                json_format_env = os.getenv("OPENAI_JSON_RESPONSE_FORMAT")
+                if json_format_env is not None:
+                    json_format_flag = json_format_env.lower() in ("1", "true", "yes")
+
+            # connection pool limits for the async client
+            pool_config = openai_config.get("connection_pool", {}) or {}
+            max_connections = int(pool_config.get("max_connections") or os.getenv("OPENAI_MAX_CONNECTIONS") or 100)
+            max_keepalive = int(pool_config.get("max_keepalive_connections") or os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS") or 20)
+            keepalive_expiry = float(pool_config.get("keepalive_expiry") or os.getenv("OPENAI_KEEPALIVE_EXPIRY") or 30)
+            timeout = float(openai_config.get("timeout") or os.getenv("OPENAI_TIMEOUT") or 60)
+            caption_batch_size = int(openai_config.get("caption_batch_size") or os.getenv("OPENAI_CAPTION_BATCH_SIZE") or 10)
+
             # Initialize OpenAIService even if model_routes.json was missing, using env vars/defaults
             self.openai_service = OpenAIService(
                 api_key=api_key,
                 model=model,
                 base_url=base_url,
-                stream=stream_flag
+                stream=stream_flag,
+                async_client=async_flag,
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+                timeout=timeout,
+                caption_batch_size=caption_batch_size,
+                json_response_format=json_format_flag
             )
 
             # ----- StabilityAI / image service init (unchanged) -----
@@ -116,17 +150,54 @@ class ServiceManager:
 
             engine = stability_config.get("engine") or os.getenv("STABILITY_ENGINE") or "stable-diffusion-2"
 
+            # base_url can point at a local stub server for load tests
+            stability_base_url = stability_config.get("base_url") or os.getenv("STABILITY_BASE_URL")
+
+            http2_flag = True
+            if "http2" in stability_config:
+                http2_flag = bool(stability_config.get("http2"))
+            else:
+                http2_env = os.getenv("STABILITY_HTTP2")
+                if http2_env is not None:
+                    http2_flag = http2_env.lower() in ("1", "true", "yes")
+
+            stability_pool = stability_config.get("connection_pool", {}) or {}
+
             self.stability_service = StabilityAIService(
                 api_key=stability_api_key,
-                engine=engine
+                engine=engine,
+                base_url=stability_base_url,
+                http2=http2_flag,
+                max_connections=int(stability_pool.get("max_connections") or os.getenv("STABILITY_MAX_CONNECTIONS") or 20),
+                max_keepalive_connections=int(stability_pool.get("max_keepalive_connections") or os.getenv("STABILITY_MAX_KEEPALIVE_CONNECTIONS") or 10),
+                keepalive_expiry=float(stability_pool.get("keepalive_expiry") or os.getenv("STABILITY_KEEPALIVE_EXPIRY") or 60),
+                timeout=float(stability_config.get("timeout") or os.getenv("STABILITY_TIMEOUT") or 30)
             )
 
             logger.info("✅ All services initialized (OpenAI/Stability).")
         except Exception as e:
             logger.error(f"❌ Service initialization failed: {e}")
 
-    async def generate_bhai_caption(self, dish: str, calories: int) -> str:
-        """Generate bhai-style caption with fallback"""
+    async def start(self):
+        """Open long-lived connections to the external APIs"""
+        if self.openai_service:
+            await self.openai_service.start()
+        if self.stability_service:
+            await self.stability_service.start()
+
+    async def aclose(self):
+        """Release pooled connections held by the external API clients"""
+        if self.openai_service:
+            await self.openai_service.aclose()
+        if self.stability_service:
+            await self.stability_service.aclose()
+
+    async def generate_bhai_caption(self, dish: str, calories: int, fallback: bool = True) -> str:
+        """Generate bhai-style caption with fallback (raises ExternalAPIError instead if fallback is False)"""
+        if not fallback:
+            if not self.openai_service:
+                raise ExternalAPIError("openai", "service not initialized")
+            return await self.openai_service.generate_bhai_caption(dish, calories, fallback=False)
         try:
             if self.openai_service:
                 return await self.openai_service.generate_bhai_caption(dish, calories)
@@ -136,8 +207,12 @@ class ServiceManager:
             logger.error(f"❌ Bhai caption generation failed: {e}")
             return self._fallback_bhai_caption(dish, calories)
 
-    async def generate_formal_caption(self, dish: str, calories: int) -> str:
-        """Generate formal caption with fallback"""
+    async def generate_formal_caption(self, dish: str, calories: int, fallback: bool = True) -> str:
+        """Generate formal caption with fallback (raises ExternalAPIError instead if fallback is False)"""
+        if not fallback:
+            if not self.openai_service:
+                raise ExternalAPIError("openai", "service not initialized")
+            return await self.openai_service.generate_formal_caption(dish, calories, fallback=False)
         try:
             if self.openai_service:
                 return await self.openai_service.generate_formal_caption(dish, calories)
@@ -147,8 +222,30 @@ class ServiceManager:
             logger.error(f"❌ Formal caption generation failed: {e}")
             return self._fallback_formal_caption(dish, calories)
 
-    async def generate_dish_image(self, dish: str) -> str:
-        """Generate dish image with fallback"""
+    async def generate_captions_batch(self, dishes: List[Tuple[str, int]]) -> List[Dict[str, str]]:
+        """
+        Generate bhai and formal captions for many (dish, calories) pairs with fallback
+
+        Template captions carry "fallback": True so callers can keep them out of the cache.
+        """
+        try:
+            if self.openai_service:
+                return await self.openai_service.generate_captions_batch(dishes)
+        except Exception as e:
+            logger.error(f"❌ Batched caption generation failed: {e}")
+        return [
+            {"bhai": self._fallback_bhai_caption(dish, calories),
+             "formal": self._fallback_formal_caption(dish, calories),
+             "fallback": True}
+            for dish, calories in dishes
+        ]
+
+    async def generate_dish_image(self, dish: str, fallback: bool = True) -> str:
+        """Generate dish image with fallback (raises ExternalAPIError instead if fallback is False)"""
+        if not fallback:
+            if not self.stability_service:
+                raise ExternalAPIError("stability", "service not initialized")
+            return await self.stability_service.generate_dish_image(dish, fallback=False)
         try:
             if self.stability_service:
                 image_url = await self.stability_service.generate_dish_image(dish)
@@ -190,7 +287,7 @@ class ServiceManager:
     def get_service_status(self) -> Dict[str, bool]:
         """Get status of all services"""
         return {
-            "openai": self.openai_service is not None and getattr(self.openai_service, "client", None) is not None,
+            "openai": self.openai_service is not None and self.openai_service.available,
             "stability": self.stability_service is not None and getattr(self.stability_service, "api_key", None) is not None,
             "model_routes_loaded": bool(self.model_routes)
         }
@@ -0,0 +1,68 @@
+"""
+Single-flight request coalescing for expensive async work
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Run at most one in-flight call per key.
+
+    The first caller for a key starts the work as a task; concurrent callers
+    with the same key wait on that task and share its result (or exception).
+    The work runs as its own task so a cancelled caller does not abort it for
+    everyone else. Once it finishes the key is released and the next call
+    starts fresh work.
+    """
+
+    def __init__(self, name: str = "single-flight"):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn() once for all concurrent callers of key
+
+        Args:
+            key: Hashable identity of the work (e.g. (dish_name, 'image'))
+            fn: Zero-argument coroutine factory producing the result
+
+        Returns:
+            The shared result of fn()
+        """
+        task = self._calls.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"🔗 [{self.name}] Joining in-flight call for {key}")
+
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        """Forget a finished call so the next caller starts fresh work"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether work for key is currently running"""
+        return key in self._calls
+
+    def stats(self) -> Dict[str, int]:
+        """Started vs coalesced call counters"""
+        return {
+            'in_flight': len(self._calls),
+            'started': self.started,
+            'coalesced': self.coalesced
+        }
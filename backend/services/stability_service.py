@@ -3,27 +3,116 @@ StabilityAI service for image generation
 """
 
 import os
+import base64
 import logging
+import tempfile
 import httpx
 import aiofiles
-from typing import Optional
+from typing import Optional, Tuple
 from pathlib import Path
-import time
 import hashlib
 from dotenv import load_dotenv
+from .image_store import image_store
+from error_handlers import ExternalAPIError
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 
+class _Base64ArtifactDecoder:
+    """
+    Incremental decoder for the first ``"base64"`` artifact in a Stability JSON body.
+
+    Bytes are fed in as they arrive from the network. Only the base64 string
+    value is consumed and it is decoded in 4-character groups, so memory use is
+    bounded by the network chunk size rather than the size of the image.
+    """
+    
+    KEY = b'"base64"'
+    
+    def __init__(self):
+        self._state = 'key'
+        self._carry = b''
+        self._pending = b''
+        self.done = False
+        self.decoded_bytes = 0
+    
+    def feed(self, chunk: bytes) -> bytes:
+        """Consume a chunk of the response body and return newly decoded image bytes"""
+        if self.done:
+            return b''
+        
+        data = self._carry + chunk
+        self._carry = b''
+        decoded = []
+        i = 0
+        
+        while i < len(data) and not self.done:
+            if self._state == 'key':
+                idx = data.find(self.KEY, i)
+                if idx < 0:
+                    # Keep a tail in case the key straddles two chunks
+                    self._carry = data[max(i, len(data) - len(self.KEY) + 1):]
+                    break
+                i = idx + len(self.KEY)
+                self._state = 'separator'
+            
+            elif self._state == 'separator':
+                byte = data[i:i + 1]
+                i += 1
+                if byte == b'"':
+                    self._state = 'value'
+                elif byte not in b' \t\r\n:':
+                    raise ValueError("Unexpected token after base64 key in StabilityAI response")
+            
+            else:
+                end = data.find(b'"', i)
+                segment = data[i:] if end < 0 else data[i:end]
+                i = len(data) if end < 0 else end + 1
+                
+                # JSON may escape '/' as '\/'; a trailing backslash waits for the next chunk
+                if end < 0 and segment.endswith(b'\\'):
+                    self._carry = b'\\'
+                    segment = segment[:-1]
+                self._pending += segment.replace(b'\\', b'')
+                
+                usable = len(self._pending) // 4 * 4
+                if end >= 0:
+                    usable = len(self._pending)
+                    self.done = True
+                
+                if usable:
+                    decoded.append(base64.b64decode(self._pending[:usable]))
+                    self._pending = self._pending[usable:]
+        
+        out = b''.join(decoded)
+        self.decoded_bytes += len(out)
+        return out
+
+
 class StabilityAIService:
     """Service for StabilityAI image generation"""
     
-    def __init__(self, api_key: Optional[str] = None, engine: str = "stable-diffusion-2"):
+    def __init__(self, api_key: Optional[str] = None, engine: str = "stable-diffusion-2",
+                 base_url: Optional[str] = None, http2: bool = True,
+                 max_connections: int = 20, max_keepalive_connections: int = 10,
+                 keepalive_expiry: float = 60.0, timeout: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         self.api_key = api_key or os.getenv("STABILITY_KEY")
         self.engine = engine
-        self.base_url = "https://api.stability.ai"
+        # Overridable so load tests can point at a local stub server
+        self.base_url = (base_url or os.getenv("STABILITY_BASE_URL") or "https://api.stability.ai").rstrip("/")
+        self.http2 = http2
+        self.timeout = timeout
+        # Tests swap in an httpx.MockTransport
+        self.transport = transport
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._client: Optional[httpx.AsyncClient] = None
         self.images_dir = Path("data/images")
         
         # Ensure images directory exists
@@ -34,36 +123,80 @@ class StabilityAIService:
         else:
             logger.warning("⚠️ StabilityAI API key not provided")
     
-    async def generate_dish_image(self, dish: str) -> Optional[str]:
-        """Generate dish image using Stability API"""
+    async def start(self):
+        """Open the long-lived HTTP client (called on app startup)"""
+        if self._client is not None:
+            return
+        
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401 - required by httpx for HTTP/2
+            except ImportError:
+                logger.warning("⚠️ 'h2' package not installed, StabilityAI client falling back to HTTP/1.1")
+                http2 = False
+        
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            limits=self.limits,
+            timeout=self.timeout,
+            transport=self.transport
+        )
+        logger.info(f"✅ StabilityAI HTTP client opened ({self.base_url}, http2={http2})")
+    
+    async def aclose(self):
+        """Close the long-lived HTTP client (called on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info("🔌 StabilityAI HTTP client closed")
+    
+    async def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared client, opening it lazily if startup did not"""
+        if self._client is None:
+            await self.start()
+        return self._client
+    
+    async def generate_dish_image(self, dish: str, fallback: bool = True) -> Optional[str]:
+        """
+        Generate dish image using Stability API
+        
+        Args:
+            dish: Name of the dish
+            fallback: Return a placeholder image on failure; if False raise
+                ExternalAPIError instead (callers that cache the result)
+        """
         if not self.api_key:
+            if not fallback:
+                raise ExternalAPIError("stability", "API key not available")
             logger.warning("⚠️ StabilityAI API key not available, using fallback")
             return await self._get_fallback_image(dish)
         
         try:
-            # Create a unique filename
-            timestamp = int(time.time())
-            safe_dish_name = self._sanitize_filename(dish)
-            filename = f"{safe_dish_name}_{timestamp}.png"
-            filepath = self.images_dir / filename
-            
             # Generate image prompt
             prompt = self._create_image_prompt(dish)
             
-            # Make API request
-            image_data = await self._make_stability_request(prompt)
+            # Stream the API response straight to disk
+            streamed = await self._stream_stability_image(prompt)
             
-            if image_data:
-                # Save image
-                await self._save_image(image_data, filepath)
-                image_url = f"/data/images/{filename}"
+            if streamed:
+                # Store by content hash (deduplicates and renders size variants)
+                tmp_path, digest = streamed
+                image_url = await image_store.ingest(tmp_path, digest)
                 logger.info(f"✅ Generated image for {dish}: {image_url}")
                 return image_url
+            elif not fallback:
+                raise ExternalAPIError("stability", f"No image generated for {dish}")
             else:
                 return await self._get_fallback_image(dish)
                 
+        except ExternalAPIError:
+            raise
         except Exception as e:
             logger.error(f"❌ StabilityAI image generation failed: {e}")
+            if not fallback:
+                raise ExternalAPIError("stability", str(e))
             return await self._get_fallback_image(dish)
     
     def _create_image_prompt(self, dish: str) -> str:
@@ -76,10 +209,20 @@ class StabilityAIService:
         
         return prompt
     
-    async def _make_stability_request(self, prompt: str) -> Optional[bytes]:
-        """Make request to StabilityAI API"""
+    async def _stream_stability_image(self, prompt: str) -> Optional[Tuple[Path, str]]:
+        """
+        Request an image from StabilityAI and stream it to a temp file
+        
+        The JSON body is never materialized: the base64 artifact is decoded
+        incrementally into a temp file in the images directory (so it can be
+        atomically renamed into the image store) while its SHA-256 is computed.
+        
+        Returns:
+            (temp file path, hex sha256) or None on failure
+        """
+        tmp_path = None
         try:
-            url = f"{self.base_url}/v1/generation/{self.engine}/text-to-image"
+            url = f"/v1/generation/{self.engine}/text-to-image"
             
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
@@ -102,36 +245,44 @@ class StabilityAIService:
                 "style_preset": "photographic"
             }
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("artifacts") and len(result["artifacts"]) > 0:
-                        # Decode base64 image
-                        import base64
-                        image_data = base64.b64decode(result["artifacts"][0]["base64"])
-                        return image_data
-                    else:
-                        logger.error("❌ No image artifacts in StabilityAI response")
-                        return None
-                else:
-                    logger.error(f"❌ StabilityAI API error: {response.status_code} - {response.text}")
+            client = await self._get_client()
+            async with client.stream("POST", url, headers=headers, json=payload) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"❌ StabilityAI API error: {response.status_code} - {body[:500]!r}")
                     return None
+                
+                # Temp file lives next to the destination so the rename is atomic
+                fd, tmp_name = tempfile.mkstemp(dir=self.images_dir, suffix=".part")
+                os.close(fd)
+                tmp_path = Path(tmp_name)
+                
+                decoder = _Base64ArtifactDecoder()
+                hasher = hashlib.sha256()
+                async with aiofiles.open(tmp_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes():
+                        image_bytes = decoder.feed(chunk)
+                        if image_bytes:
+                            hasher.update(image_bytes)
+                            await f.write(image_bytes)
+                        if decoder.done:
+                            break
+            
+            if not decoder.done or decoder.decoded_bytes == 0:
+                logger.error("❌ No image artifacts in StabilityAI response")
+                return None
+            
+            streamed = (tmp_path, hasher.hexdigest())
+            tmp_path = None
+            logger.info(f"✅ Image streamed to {streamed[0]} ({decoder.decoded_bytes} bytes)")
+            return streamed
                     
         except Exception as e:
             logger.error(f"❌ StabilityAI API request failed: {e}")
             return None
-    
-    async def _save_image(self, image_data: bytes, filepath: Path):
-        """Save image data to file"""
-        try:
-            async with aiofiles.open(filepath, 'wb') as f:
-                await f.write(image_data)
-            logger.info(f"✅ Image saved to {filepath}")
-        except Exception as e:
-            logger.error(f"❌ Failed to save image: {e}")
-            raise
+        finally:
+            if tmp_path is not None:
+                tmp_path.unlink(missing_ok=True)
     
     async def _get_fallback_image(self, dish: str) -> str:
         """Get fallback image when API fails"""
@@ -0,0 +1,290 @@
+"""
+Cache warm-up for the dish catalog
+
+Walks the catalog (the dishes table, or nutrition_lookup.csv) in popularity
+order from user_meals and fills the preview, image and caption caches, so
+the first user of a dish after a deploy or cache flush gets a cache hit.
+Dishes are generated a chunk at a time through PreviewPipeline.generate_batch
+(one batched caption request per chunk) with bounded concurrency and
+per-provider rate limits; progress is saved after every dish so an
+interrupted run resumes where it stopped.
+
+Run as a module:
+    python -m services.warmup_service [--dry-run] [--limit N] [--source db|csv] [--reset]
+"""
+
+import os
+import json
+import math
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from datetime import datetime
+from sqlalchemy import select, func
+
+from database import AsyncSessionLocal, Dish, UserMeal
+from .cache_service import cache_service
+from .preview_pipeline import preview_pipeline
+from .nutrition_table import NutritionTable
+from .catalog_service import catalog_service
+from .openai_service import OpenAIService
+from .rate_limiter import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Rough tokens per dish in a batched caption completion: its listing entry in,
+# bhai (~60) and formal (~120) captions out
+CAPTION_TOKENS_PER_DISH = 200
+
+
+class CacheWarmer:
+    """Fills the preview caches for the catalog, most popular dishes first"""
+
+    def __init__(self, progress_path: str = "data/warmup_progress.json", concurrency: int = 2,
+                 chunk_size: int = 10, images_per_minute: float = 30,
+                 caption_requests_per_minute: float = 60, image_cost_usd: float = 0.01,
+                 caption_cost_per_1k_tokens_usd: float = 0.0006):
+        self.progress_path = Path(progress_path)
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.images_per_minute = images_per_minute
+        self.caption_requests_per_minute = caption_requests_per_minute
+        self.image_cost_usd = image_cost_usd
+        self.caption_cost_per_1k_tokens_usd = caption_cost_per_1k_tokens_usd
+        self._task: Optional[asyncio.Task] = None
+
+    async def _popularity(self, db) -> Dict[str, int]:
+        """Meal count per normalized dish name"""
+        dish_name = func.lower(func.trim(UserMeal.dish_name))
+        rows = (await db.execute(
+            select(dish_name, func.count(UserMeal.id)).group_by(dish_name)
+        )).all()
+        return {name: count for name, count in rows}
+
+    async def candidates(self, source: str = "db", limit: Optional[int] = None) -> List[str]:
+        """
+        Catalog dish names, most eaten first (then alphabetically)
+
+        Args:
+            source: 'db' for the dishes table, 'csv' for nutrition_lookup.csv
+            limit: Only the first N dishes
+        """
+        async with AsyncSessionLocal() as db:
+            if source == "csv":
+                names = NutritionTable.from_csv(catalog_service.csv_path).names
+            else:
+                names = (await db.execute(select(Dish.name))).scalars().all()
+            popularity = await self._popularity(db)
+
+        unique = {}
+        for name in names:
+            unique.setdefault(preview_pipeline.normalize(name), name)
+        ordered = sorted(unique.items(), key=lambda item: (-popularity.get(item[0], 0), item[0]))
+        dishes = [name for _, name in ordered]
+        return dishes[:limit] if limit else dishes
+
+    async def _missing(self, dishes: List[str]) -> Dict[str, Dict[str, bool]]:
+        """Which artifacts each uncached (or stale) dish still needs"""
+        async with AsyncSessionLocal() as db:
+            cached = await cache_service.get_cached_many(
+                dishes, ('preview', 'image', 'captions'), db, allow_stale=False
+            )
+
+        missing = {}
+        for dish in dishes:
+            normalized_name = preview_pipeline.normalize(dish)
+            if (normalized_name, 'preview') in cached:
+                continue
+            missing[dish] = {
+                'image': (normalized_name, 'image') not in cached,
+                'captions': (normalized_name, 'captions') not in cached
+            }
+        return missing
+
+    def _load_progress(self) -> Dict[str, Any]:
+        """Progress of an unfinished run, or a fresh record"""
+        if self.progress_path.exists():
+            try:
+                progress = json.loads(self.progress_path.read_text())
+                if not progress.get('completed_at'):
+                    return progress
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable warm-up progress file {self.progress_path}: {e}")
+        return {'started_at': datetime.utcnow().isoformat(), 'completed_at': None, 'done': [], 'failed': {}}
+
+    def _save_progress(self, progress: Dict[str, Any]):
+        """Write the progress file atomically"""
+        progress['updated_at'] = datetime.utcnow().isoformat()
+        self.progress_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.progress_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(progress, indent=2))
+        os.replace(tmp_path, self.progress_path)
+
+    def reset(self):
+        """Forget the progress of an unfinished run"""
+        self.progress_path.unlink(missing_ok=True)
+
+    async def estimate(self, source: str = "db", limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Dry run: what a warm-up would generate and roughly what it would cost
+
+        Returns:
+            Counts of dishes and provider requests, estimated tokens, cost (USD)
+            and the minimum duration allowed by the rate limits
+        """
+        missing = await self._missing(await self.candidates(source, limit))
+        images = sum(1 for needs in missing.values() if needs['image'])
+        captioned = sum(1 for needs in missing.values() if needs['captions'])
+        caption_requests = math.ceil(captioned / self.chunk_size) if captioned else 0
+
+        preamble_tokens = len(OpenAIService._get_bhai_style_prompt()) // 4
+        caption_tokens = caption_requests * preamble_tokens + captioned * CAPTION_TOKENS_PER_DISH
+
+        minutes = []
+        if self.images_per_minute > 0:
+            minutes.append(images / self.images_per_minute)
+        if self.caption_requests_per_minute > 0:
+            minutes.append(caption_requests / self.caption_requests_per_minute)
+
+        return {
+            'dishes_to_warm': len(missing),
+            'image_requests': images,
+            'caption_requests': caption_requests,
+            'estimated_caption_tokens': caption_tokens,
+            'estimated_cost_usd': round(
+                images * self.image_cost_usd
+                + caption_tokens / 1000 * self.caption_cost_per_1k_tokens_usd, 2
+            ),
+            'min_duration_minutes': round(max(minutes, default=0.0), 1)
+        }
+
+    async def run(self, source: str = "db", limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Warm the caches, resuming an unfinished run
+
+        Args:
+            source: 'db' for the dishes table, 'csv' for nutrition_lookup.csv
+            limit: Only the N most popular dishes
+
+        Returns:
+            Counts of warmed, failed and skipped dishes
+        """
+        progress = self._load_progress()
+        # The catalog may spell a dish differently between runs or sources
+        done = {preview_pipeline.normalize(dish) for dish in progress['done']}
+
+        dishes = [
+            dish for dish in await self.candidates(source, limit)
+            if preview_pipeline.normalize(dish) not in done
+        ]
+        missing = await self._missing(dishes)
+        skipped = len(dishes) - len(missing)
+        if progress['done']:
+            logger.info(f"🔁 Resuming warm-up: {len(progress['done'])} dishes already done")
+        logger.info(f"🔥 Warming {len(missing)} dishes ({skipped} already cached)")
+
+        image_limiter = RateLimiter(self.images_per_minute, burst=self.concurrency, name="warmup-images")
+        caption_limiter = RateLimiter(self.caption_requests_per_minute, name="warmup-captions")
+
+        warmed = failed = 0
+        to_warm = list(missing)
+        for start in range(0, len(to_warm), self.chunk_size):
+            chunk = to_warm[start:start + self.chunk_size]
+            names = {preview_pipeline.normalize(dish): dish for dish in chunk}
+
+            async for result in preview_pipeline.generate_batch(
+                chunk, concurrency=self.concurrency,
+                image_limiter=image_limiter, caption_limiter=caption_limiter
+            ):
+                dish = names[result['dish']]
+                fallbacks = (result['preview'] or {}).get('meta', {}).get('fallbacks')
+                if result['error'] is not None or fallbacks:
+                    # Fallback output is not cached; retry the dish on the next run
+                    progress['failed'][dish] = result['error'] or f"fallback: {', '.join(fallbacks)}"
+                    failed += 1
+                else:
+                    progress['done'].append(dish)
+                    progress['failed'].pop(dish, None)
+                    warmed += 1
+                self._save_progress(progress)
+
+            logger.info(f"🔥 Warm-up progress: {warmed + failed}/{len(to_warm)} ({failed} failed)")
+
+        if not failed:
+            progress['completed_at'] = datetime.utcnow().isoformat()
+        self._save_progress(progress)
+
+        logger.info(f"✅ Warm-up finished: {warmed} warmed, {failed} failed, {skipped} already cached")
+        return {'warmed': warmed, 'failed': failed, 'skipped': skipped}
+
+    def start_background(self, source: str = "db", limit: Optional[int] = None):
+        """Run a warm-up as a background task (e.g. on startup)"""
+        if self._task is not None and not self._task.done():
+            return
+
+        async def warm():
+            try:
+                await self.run(source, limit)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Background cache warm-up failed: {e}")
+
+        self._task = asyncio.create_task(warm())
+        logger.info("🔥 Background cache warm-up started")
+
+    async def stop_background(self):
+        """Cancel a running background warm-up; progress is kept for the next run"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global cache warmer instance
+cache_warmer = CacheWarmer(
+    progress_path=os.getenv("WARMUP_PROGRESS_PATH") or "data/warmup_progress.json",
+    concurrency=int(os.getenv("WARMUP_CONCURRENCY") or 2),
+    chunk_size=int(os.getenv("WARMUP_CHUNK_SIZE") or 10),
+    images_per_minute=float(os.getenv("WARMUP_IMAGES_PER_MINUTE") or 30),
+    caption_requests_per_minute=float(os.getenv("WARMUP_CAPTION_REQUESTS_PER_MINUTE") or 60),
+    image_cost_usd=float(os.getenv("WARMUP_IMAGE_COST_USD") or 0.01),
+    caption_cost_per_1k_tokens_usd=float(os.getenv("WARMUP_CAPTION_COST_PER_1K_TOKENS_USD") or 0.0006)
+)
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import async_engine, init_database
+    from .service_manager import service_manager
+
+    parser = argparse.ArgumentParser(description="Pre-generate cached previews for the dish catalog")
+    parser.add_argument("--dry-run", action="store_true", help="Only estimate the work and its cost")
+    parser.add_argument("--limit", type=int, help="Only the N most popular dishes")
+    parser.add_argument("--source", choices=("db", "csv"), default="db", help="Catalog to walk")
+    parser.add_argument("--reset", action="store_true", help="Ignore the progress of an unfinished run")
+    args = parser.parse_args()
+
+    async def main():
+        if args.reset:
+            cache_warmer.reset()
+        async with AsyncSessionLocal() as db:
+            await catalog_service.load(db)
+        if args.dry_run:
+            result = await cache_warmer.estimate(args.source, args.limit)
+        else:
+            await service_manager.start()
+            try:
+                result = await cache_warmer.run(args.source, args.limit)
+            finally:
+                await service_manager.aclose()
+        await async_engine.dispose()
+        print(json.dumps(result, indent=2))
+
+    logging.basicConfig(level=logging.INFO)
+    init_database()
+    asyncio.run(main())
@@ -1,8 +1,12 @@
 # test_stability.py
+import sys
 import asyncio
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
+# The services import backend modules (error_handlers, database) by absolute name
+sys.path.insert(0, 'backend')
+
 from backend.services.service_manager import service_manager
 
 async def main():